@@ -0,0 +1,122 @@
+"""Benchmark decoding of realistic Satellite responses with every JSON codec.
+
+Bodies of the output endpoint carry Ansible console output split into
+chunks, job invocation bodies list the task state of every targeted host.
+Each available codec decodes them repeatedly and the best time out of
+several rounds is reported, along with the speedup over the standard
+library.
+
+    python -m benchmarks.codec --chunks 1000 --hosts 10000
+"""
+
+import argparse
+import importlib.util
+import json
+import sys
+import timeit
+
+from receptor_satellite import codec
+from receptor_satellite.output_stream import OutputStreamParser
+
+TASK_OUTPUT = (
+    "TASK [Gathering Facts] *********************************************\n"
+    "ok: [host{index}.example.com]\n"
+    'changed: [host{index}.example.com] => {{"changed": true, "msg": "ünïcödé"}}\n'
+)
+
+
+def output_body(chunks):
+    return json.dumps(
+        {
+            "complete": True,
+            "output": [
+                {
+                    "output_type": "stdout",
+                    "output": TASK_OUTPUT.format(index=index),
+                    "timestamp": 1600000000.123456 + index,
+                }
+                for index in range(chunks)
+            ],
+        }
+    )
+
+
+def job_invocation_body(hosts):
+    return json.dumps(
+        {
+            "id": 1,
+            "description": "Run playbook",
+            "targeting": {
+                "hosts": [
+                    {
+                        "id": index,
+                        "name": f"host{index}.example.com",
+                        "job_status": "running",
+                    }
+                    for index in range(hosts)
+                ]
+            },
+        }
+    )
+
+
+def stream(body):
+    parser = OutputStreamParser()
+    for i in range(0, len(body), 64 * 1024):
+        parser.feed(body[i : i + 64 * 1024])
+    return parser.close()
+
+
+def measure(function, body, rounds, number):
+    durations = timeit.repeat(lambda: function(body), repeat=rounds, number=number)
+    return min(durations) / number
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--hosts", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--number", type=int, default=20)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    bodies = dict(
+        output=output_body(args.chunks), job_invocation=job_invocation_body(args.hosts)
+    )
+    codecs = [
+        name
+        for name in codec.CODECS
+        if name == "json" or importlib.util.find_spec(name)
+    ]
+    for kind, body in bodies.items():
+        baseline = measure(json.loads, body, args.rounds, args.number)
+        results = {}
+        for name in codecs:
+            codec.select(name)
+            results[name] = measure(codec.loads, body, args.rounds, args.number)
+        if kind == "output":
+            results["output_stream"] = measure(stream, body, args.rounds, args.number)
+        print(
+            json.dumps(
+                dict(
+                    body=kind,
+                    size_kb=round(len(body.encode()) / 1024, 1),
+                    decode_ms={
+                        name: round(duration * 1000, 3)
+                        for name, duration in results.items()
+                    },
+                    speedup={
+                        name: round(baseline / duration, 2)
+                        for name, duration in results.items()
+                    },
+                )
+            )
+        )
+    codec.select()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import asyncio
+import itertools
+import random
+import re
+import time
+from collections import Counter
+
+from aiohttp import web
+
+
+class FakeSatellite:
+    """A local aiohttp server emulating the Satellite API used by the worker.
+
+    Every targeted host produces `chunks` output chunks of `chunk_size`
+    characters, one every `chunk_interval` seconds after the job was
+    triggered, followed by the exit status. Responses are delayed by
+    `latency` seconds and output requests fail with a 500 at `error_rate`.
+    """
+
+    def __init__(
+        self, chunks=10, chunk_size=200, chunk_interval=0.5, latency=0, error_rate=0
+    ):
+        self.chunks = chunks
+        self.chunk_size = chunk_size
+        self.chunk_interval = chunk_interval
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = Counter()
+        self.jobs = {}
+        self.__ids = itertools.count(1)
+        self.__runner = None
+        self.url = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application(middlewares=[self.__middleware])
+        app.router.add_post("/api/v2/job_invocations", self.trigger)
+        app.router.add_get("/api/v2/job_invocations/{id}", self.job_invocation)
+        app.router.add_get("/api/v2/job_invocations/{id}/hosts/{host_id}", self.output)
+        app.router.add_post("/api/v2/job_invocations/{id}/cancel", self.cancel)
+        self.__runner = web.AppRunner(app)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, host, port).start()
+        host, port = self.__runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        await self.__runner.cleanup()
+
+    @web.middleware
+    async def __middleware(self, request, handler):
+        self.requests[request.match_info.route.handler.__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    def progress(self, job):
+        elapsed = time.monotonic() - job["started_at"]
+        return min(int(elapsed / self.chunk_interval), self.chunks)
+
+    async def trigger(self, request):
+        payload = await request.json()
+        search = payload["job_invocation"]["host_ids"]
+        names = re.match(r"name \^ \((.*)\)", search).group(1).split(",")
+        job_id = next(self.__ids)
+        hosts = [
+            {"id": job_id * 1000000 + index, "name": name}
+            for index, name in enumerate(names)
+        ]
+        self.jobs[job_id] = {"started_at": time.monotonic(), "hosts": hosts}
+        return web.json_response(
+            {"id": job_id, "targeting": {"hosts": hosts}}, status=201
+        )
+
+    async def job_invocation(self, request):
+        job = self.jobs[int(request.match_info["id"])]
+        progress = self.progress(job)
+        if progress == 0:
+            job_status = "pending"
+        elif progress < self.chunks:
+            job_status = "running"
+        else:
+            job_status = "success"
+        hosts = [dict(host, job_status=job_status) for host in job["hosts"]]
+        return web.json_response({"targeting": {"hosts": hosts}})
+
+    async def output(self, request):
+        if self.error_rate and random.random() < self.error_rate:
+            return web.json_response(
+                {"error": {"message": "Simulated failure"}}, status=500
+            )
+        job = self.jobs[int(request.match_info["id"])]
+        progress = self.progress(job)
+        since = float(request.query.get("since", -1))
+        output = [
+            {
+                "output_type": "stdout",
+                "output": "x" * (self.chunk_size - 1) + "\n",
+                "timestamp": job["started_at"] + index * self.chunk_interval,
+            }
+            for index in range(progress)
+        ]
+        complete = progress == self.chunks
+        if complete:
+            output.append(
+                {
+                    "output_type": "stdout",
+                    "output": "Exit status: 0",
+                    "timestamp": job["started_at"] + progress * self.chunk_interval,
+                }
+            )
+        output = [chunk for chunk in output if chunk["timestamp"] > since]
+        return web.json_response({"complete": complete, "output": output})
+
+    async def cancel(self, request):
+        return web.json_response({"id": int(request.match_info["id"])})
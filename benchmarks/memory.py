@@ -0,0 +1,94 @@
+"""Benchmark the memory used to construct and track runs with many hosts.
+
+A run with the given number of hosts is constructed and every host is
+assigned its Satellite id and job invocation, as after triggering. The
+memory allocated per host is measured with tracemalloc, together with
+what the same hosts would take without __slots__.
+
+    python -m benchmarks.memory --hosts 1000,10000,50000
+"""
+
+import argparse
+import json
+import queue
+import sys
+import time
+import tracemalloc
+
+from receptor_satellite import worker
+from receptor_satellite.response_queue import ResponseQueue
+from receptor_satellite.worker import Host, Run
+
+from .polling import NullLogger
+
+
+def without_slots(cls):
+    """Returns a copy of `cls` keeping its attributes in a __dict__.
+
+    Subclassing would inherit __slots__ and keep every attribute in its
+    slot, the copy takes what hosts took before they used __slots__.
+    """
+    excluded = set(cls.__slots__) | {"__slots__", "__dict__", "__weakref__"}
+    namespace = {
+        name: value for name, value in vars(cls).items() if name not in excluded
+    }
+    return type(f"Dict{cls.__name__}", cls.__bases__, namespace)
+
+
+DictHost = without_slots(Host)
+
+
+def measure(hosts, host_class):
+    names = [f"host{i}.example.com" for i in range(hosts)]
+    original, worker.Host = worker.Host, host_class
+    tracemalloc.start()
+    try:
+        started = time.monotonic()
+        run = Run(
+            ResponseQueue(queue.Queue()),
+            "benchmark",
+            "benchmark",
+            "benchmark",
+            names,
+            "playbook",
+            {},
+            None,
+            NullLogger(),
+        )
+        run.update_hosts(
+            run.hosts,
+            1,
+            [{"id": index, "name": name} for index, name in enumerate(names)],
+        )
+        duration = time.monotonic() - started
+        allocated, _peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        worker.Host = original
+    return dict(
+        bytes_per_host=round(allocated / hosts), construction_s=round(duration, 3)
+    )
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", default="1000,10000,50000")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    for hosts in map(int, args.hosts.split(",")):
+        print(
+            json.dumps(
+                dict(
+                    hosts=hosts,
+                    slots=measure(hosts, Host),
+                    dict=measure(hosts, DictHost),
+                )
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark the polling path against a local fake Satellite.
+
+Every scenario triggers a run with the given number of hosts through
+Run.start and reports wall time, requests received by the fake Satellite,
+peak RSS and event loop lag. Each scenario runs in a fresh interpreter so
+the peak RSS figures do not influence each other.
+
+    python -m benchmarks.polling --hosts 100,1000,10000
+"""
+
+import argparse
+import asyncio
+import json
+import queue
+import resource
+import subprocess
+import sys
+import time
+
+from receptor_satellite.response_queue import ResponseQueue
+from receptor_satellite.satellite_api import SatelliteAPI, session_pool
+from receptor_satellite.worker import Run
+
+from .fake_satellite import FakeSatellite
+
+
+class NullLogger:
+    def info(self, message):
+        pass
+
+    warning = error = info
+
+
+class LagMonitor:
+    """Measures how late the event loop wakes up a periodic timer."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.lags = []
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(loop.time() - expected, 0))
+
+    def summary(self):
+        lags = sorted(self.lags) or [0]
+        return dict(
+            max_ms=round(lags[-1] * 1000, 2),
+            p99_ms=round(lags[int(len(lags) * 0.99)] * 1000, 2),
+            mean_ms=round(sum(lags) / len(lags) * 1000, 2),
+        )
+
+
+async def scenario(args):
+    satellite = FakeSatellite(
+        args.chunks, args.chunk_size, args.chunk_interval, args.latency, args.error_rate
+    )
+    url = await satellite.start()
+    messages = queue.Queue()
+    run = Run(
+        ResponseQueue(messages),
+        "benchmark",
+        f"benchmark-{args.hosts}",
+        "benchmark",
+        [f"host{i}.example.com" for i in range(args.hosts)],
+        "playbook",
+        dict(
+            text_updates=args.text_updates,
+            polling_concurrency=args.concurrency,
+            trigger_batch_size=args.batch_size,
+        ),
+        SatelliteAPI("admin", "changeme", url, None),
+        NullLogger(),
+    )
+    # The run configuration does not allow intervals this short
+    run.config.text_update_interval = args.interval
+    for host in run.hosts:
+        host.interval = args.interval
+
+    monitor = LagMonitor()
+    lag_task = asyncio.ensure_future(monitor.run())
+    started = time.monotonic()
+    await run.start()
+    wall_time = time.monotonic() - started
+    lag_task.cancel()
+    await session_pool.close()
+    await satellite.stop()
+
+    return dict(
+        hosts=args.hosts,
+        wall_time_s=round(wall_time, 3),
+        requests=dict(satellite.requests),
+        messages=messages.qsize(),
+        # ru_maxrss is in kilobytes on Linux
+        peak_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        loop_lag=monitor.summary(),
+    )
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", default="100,1000,10000")
+    parser.add_argument("--chunks", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--chunk-interval", type=float, default=1.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--text-updates", action="store_true")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    if args.single:
+        args.hosts = int(args.hosts)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        result = loop.run_until_complete(scenario(args))
+        print(json.dumps(result))
+        return
+    for hosts in args.hosts.split(","):
+        output = subprocess.check_output(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.polling",
+                *argv,
+                "--hosts",
+                hosts,
+                "--single",
+            ]
+        )
+        print(output.decode().strip())
+
+
+if __name__ == "__main__":
+    main()
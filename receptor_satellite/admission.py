@@ -0,0 +1,87 @@
+import asyncio
+from collections import deque
+
+from . import metrics
+
+
+class AdmissionControl:
+    """Limits the runs polled at the same time and the hosts they poll.
+
+    The limits apply to the whole worker. Runs over them wait in order of
+    arrival. A run with more hosts than `max_hosts` is admitted once
+    nothing else is being polled, so it does not wait forever.
+    """
+
+    def __init__(self, max_runs=None, max_hosts=None):
+        self.max_runs = max_runs
+        self.max_hosts = max_hosts
+        self.runs = 0
+        self.hosts = 0
+        self.__waiters = deque()
+
+    @property
+    def waiting(self):
+        return len(self.__waiters)
+
+    @property
+    def waiting_hosts(self):
+        return sum(hosts for hosts, _future in self.__waiters)
+
+    def configure(self, max_runs=None, max_hosts=None):
+        self.max_runs = None if max_runs is None else int(max_runs)
+        self.max_hosts = None if max_hosts is None else int(max_hosts)
+        # Raised or removed limits may make room for runs already waiting
+        self.__process()
+
+    def available(self, hosts):
+        return not self.__waiters and self.__fits(hosts)
+
+    def __fits(self, hosts):
+        if self.max_runs is not None and self.runs >= self.max_runs:
+            return False
+        if self.max_hosts is not None and self.hosts:
+            return self.hosts + hosts <= self.max_hosts
+        return True
+
+    async def acquire(self, hosts):
+        if self.available(hosts):
+            self.__admit(hosts)
+            return
+        future = asyncio.get_event_loop().create_future()
+        waiter = (hosts, future)
+        self.__waiters.append(waiter)
+        self.__update_metrics()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(hosts, runs=1)
+            elif waiter in self.__waiters:
+                self.__waiters.remove(waiter)
+                self.__process()
+            raise
+
+    def release(self, hosts, runs=0):
+        self.runs -= runs
+        self.hosts -= hosts
+        self.__process()
+
+    def __admit(self, hosts):
+        self.runs += 1
+        self.hosts += hosts
+
+    def __process(self):
+        while self.__waiters and self.__fits(self.__waiters[0][0]):
+            hosts, future = self.__waiters.popleft()
+            if future.done():
+                continue
+            self.__admit(hosts)
+            future.set_result(None)
+        self.__update_metrics()
+
+    def __update_metrics(self):
+        metrics.QUEUED_RUNS.set(self.waiting)
+        metrics.QUEUED_HOSTS.set(self.waiting_hosts)
+
+
+admission = AdmissionControl()
@@ -0,0 +1,98 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from . import codec
+
+# Encoding a large run and writing it to disk would hold up every other
+# coroutine of the worker. A single thread keeps the writes in the order
+# they were made, so a late save never brings back a deleted run.
+write_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="receptor-satellite-checkpoint"
+)
+
+
+async def in_executor(function, *args):
+    return await asyncio.get_event_loop().run_in_executor(
+        write_executor, function, *args
+    )
+
+
+class CheckpointStore:
+    """Persists the state of runs in progress to a local SQLite database.
+
+    Every run is stored as a single JSON document keyed by its playbook run
+    id and removed once the run finishes, so whatever is left in the store
+    when the worker starts belongs to runs interrupted by a restart.
+    Connections are opened per operation, the store is used both from
+    receptor's threads and from `write_executor`.
+    """
+
+    DEFAULT_INTERVAL = 30
+
+    def __init__(self, path, interval=DEFAULT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.resumed = False
+        with closing(self.__connect()) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "playbook_run_id TEXT PRIMARY KEY, "
+                "state TEXT NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+
+    def __connect(self):
+        return sqlite3.connect(self.path)
+
+    def save(self, state):
+        with closing(self.__connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?)",
+                (state["playbook_run_id"], codec.dumps(state), time.time()),
+            )
+
+    def delete(self, playbook_run_id):
+        with closing(self.__connect()) as connection, connection:
+            connection.execute(
+                "DELETE FROM runs WHERE playbook_run_id = ?", (playbook_run_id,)
+            )
+
+    def load(self):
+        with closing(self.__connect()) as connection:
+            rows = connection.execute(
+                "SELECT state FROM runs ORDER BY updated_at"
+            ).fetchall()
+        return [codec.loads(state) for (state,) in rows]
+
+    def take_interrupted(self):
+        """Returns the stored runs, but only the first time it is called.
+
+        Runs saved later on belong to this process and are still running.
+        """
+        if self.resumed:
+            return []
+        self.resumed = True
+        return self.load()
+
+
+class CheckpointStores:
+    """One CheckpointStore per database file, shared by the whole worker."""
+
+    def __init__(self):
+        self.__stores = {}
+
+    def get(self, path, interval=None):
+        if not path:
+            return None
+        store = self.__stores.get(path)
+        if store is None:
+            store = self.__stores[path] = CheckpointStore(path)
+        if interval is not None:
+            store.interval = float(interval)
+        return store
+
+
+checkpoint_stores = CheckpointStores()
@@ -0,0 +1,54 @@
+import time
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, url):
+        super().__init__(f"Requests to {url} are suspended after repeated failures")
+
+
+class CircuitBreaker:
+    """Stops requests to a Satellite that keeps failing.
+
+    The breaker opens after `failure_threshold` consecutive failures. Once
+    `reset_timeout` seconds pass it becomes half-open and lets a single
+    probe request through, which either closes it again or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.__opened_at = None
+        self.__probe_started_at = None
+
+    def allow(self):
+        now = self.clock()
+        if self.state == self.OPEN and now >= self.__opened_at + self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self.__probe_started_at = None
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN:
+            # A probe that never reported back must not keep the breaker stuck
+            probing = self.__probe_started_at is not None
+            if probing and now < self.__probe_started_at + self.reset_timeout:
+                return False
+            self.__probe_started_at = now
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.__opened_at = self.clock()
@@ -0,0 +1,49 @@
+"""JSON encoding and decoding using the fastest library installed.
+
+orjson is preferred, then ujson, falling back to the standard library.
+Errors raised while decoding are always subclasses of ValueError.
+"""
+
+import json
+
+
+def _orjson():
+    import orjson
+
+    return orjson.loads, lambda obj: orjson.dumps(obj).decode()
+
+
+def _ujson():
+    import ujson
+
+    return ujson.loads, ujson.dumps
+
+
+def _json():
+    return json.loads, json.dumps
+
+
+CODECS = dict(orjson=_orjson, ujson=_ujson, json=_json)
+
+name = None
+loads = None
+dumps = None
+
+
+def select(preferred=None):
+    """Switches to the codec named `preferred` or to the fastest available one."""
+    global name, loads, dumps
+    candidates = [preferred] if preferred else list(CODECS)
+    for candidate in candidates:
+        if candidate not in CODECS:
+            continue
+        try:
+            loads, dumps = CODECS[candidate]()
+        except ImportError:
+            continue
+        name = candidate
+        return name
+    raise ImportError(f"JSON codec {preferred} is not available")
+
+
+select()
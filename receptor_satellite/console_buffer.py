@@ -0,0 +1,102 @@
+from collections import deque
+
+
+class ConsoleBuffer:
+    """Accumulates the console output of a host in at most `limit` characters.
+
+    Once the output grows over the limit, only its first and last
+    `limit / 2` characters are kept, the part in between is replaced with
+    a marker stating how much was left out. Without a limit everything is
+    kept.
+    """
+
+    MARKER = "\n[... {} characters of output truncated ...]\n"
+
+    __slots__ = (
+        "limit",
+        "length",
+        "__head",
+        "__head_length",
+        "__tail",
+        "__tail_length",
+    )
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        # Characters appended so far, including truncated ones
+        self.length = 0
+        # Containers are only created once needed, runs with many hosts
+        # keep a lot of buffers which stay empty or never fill their head
+        self.__head = ()
+        self.__head_length = 0
+        self.__tail = ()
+        self.__tail_length = 0
+
+    @property
+    def truncated(self):
+        return self.length - self.__head_length - self.__tail_length
+
+    def append(self, text):
+        if not text:
+            return
+        self.length += len(text)
+        if not self.__head:
+            self.__head = []
+        if self.limit is None:
+            self.__head.append(text)
+            self.__head_length += len(text)
+            return
+        head_limit = self.limit // 2
+        if self.__head_length < head_limit:
+            piece = text[: head_limit - self.__head_length]
+            self.__head.append(piece)
+            self.__head_length += len(piece)
+            text = text[len(piece) :]
+            if not text:
+                return
+        if not self.__tail:
+            self.__tail = deque()
+        self.__tail.append(text)
+        self.__tail_length += len(text)
+        excess = self.__tail_length - (self.limit - head_limit)
+        while excess > 0:
+            first = self.__tail[0]
+            if len(first) <= excess:
+                self.__tail.popleft()
+                removed = len(first)
+            else:
+                self.__tail[0] = first[excess:]
+                removed = excess
+            self.__tail_length -= removed
+            excess -= removed
+
+    def text(self):
+        return self.text_since(0)
+
+    def text_since(self, position):
+        """Returns what was appended after the first `position` characters."""
+        tail_start = self.length - self.__tail_length
+        if position >= tail_start:
+            return self.__suffix(self.__tail, self.length - position)
+        parts = []
+        if position < self.__head_length:
+            parts.append(self.__suffix(self.__head, self.__head_length - position))
+        truncated = tail_start - max(position, self.__head_length)
+        if truncated:
+            parts.append(self.MARKER.format(truncated))
+        parts.append("".join(self.__tail))
+        return "".join(parts)
+
+    def endswith(self, suffix):
+        return self.text_since(max(self.length - len(suffix), 0)).endswith(suffix)
+
+    @staticmethod
+    def __suffix(pieces, count):
+        # Joins only the pieces covering the last `count` characters
+        selected = []
+        for piece in reversed(pieces):
+            if count <= 0:
+                break
+            selected.append(piece if len(piece) <= count else piece[-count:])
+            count -= len(piece)
+        return "".join(reversed(selected))
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+
+class EventLoopThread:
+    """A single long-lived event loop running in a background thread.
+
+    Receptor calls the exported worker functions from its own threads,
+    coroutines are submitted to this loop so that all runs, cancels and
+    health checks share one scheduler, connection pool and run registry.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.__thread = None
+        self.__lock = threading.Lock()
+
+    def start(self):
+        with self.__lock:
+            if self.__thread is not None and self.__thread.is_alive():
+                return self.loop
+            self.loop = asyncio.new_event_loop()
+            self.__thread = threading.Thread(
+                target=self.__run_forever, name="receptor-satellite", daemon=True
+            )
+            self.__thread.start()
+            return self.loop
+
+    def __run_forever(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coroutine):
+        loop = self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    def call_soon(self, callback, *args):
+        # State shared by coroutines of the loop may only be changed in it
+        self.start().call_soon_threadsafe(callback, *args)
+
+    def stop(self, cleanup=None):
+        with self.__lock:
+            if self.__thread is None:
+                return
+            if cleanup is not None:
+                asyncio.run_coroutine_threadsafe(cleanup(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.__thread.join()
+            self.loop.close()
+            self.loop = None
+            self.__thread = None
+
+
+event_loop = EventLoopThread()
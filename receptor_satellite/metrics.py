@@ -0,0 +1,274 @@
+import asyncio
+import bisect
+import os
+import threading
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.TYPE}"
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{format_labels(self.labelnames, key)} {value}"
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self.key(labels), 0)
+
+
+class Gauge(Counter):
+    TYPE = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, _total = self.values.get(self.key(labels), ([], 0))
+        return sum(counts)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.TYPE}"
+        for key, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = format_labels(self.labelnames, key, [("le", bound)])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = [line for metric in self.metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """Exposes a registry over HTTP and/or by periodically dumping it to a file."""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.__runner = None
+        self.__dumper = None
+
+    async def start(self, port=None, path=None, interval=15):
+        if port and self.__runner is None:
+            app = web.Application()
+            app.router.add_get("/metrics", self.__handle)
+            self.__runner = web.AppRunner(app)
+            await self.__runner.setup()
+            await web.TCPSite(self.__runner, "127.0.0.1", int(port)).start()
+        if path and self.__dumper is None:
+            self.__dumper = asyncio.ensure_future(self.__dump(path, interval))
+
+    async def __handle(self, _request):
+        return web.Response(
+            text=self.registry.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    def dump(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.registry.render())
+        os.replace(tmp_path, path)
+
+    async def __dump(self, path, interval):
+        while True:
+            self.dump(path)
+            await asyncio.sleep(interval)
+
+    async def stop(self):
+        if self.__dumper is not None:
+            self.__dumper.cancel()
+            self.__dumper = None
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
+
+
+class LoopLagMonitor:
+    """Measures how late an event loop runs a timer due every `interval` seconds.
+
+    The lag shows how long coroutines of the worker had to wait for the
+    loop while it was busy running something else.
+    """
+
+    def __init__(self, histogram, interval=0.5):
+        self.histogram = histogram
+        self.interval = interval
+        self.last = None
+        self.__loop = None
+        self.__expected = None
+        self.__lock = threading.Lock()
+
+    def watch(self, loop):
+        # May be called from any thread, the timer runs in the loop's thread
+        with self.__lock:
+            if self.__loop is loop:
+                return
+            self.__loop = loop
+        loop.call_soon_threadsafe(self.__schedule, loop)
+
+    def __schedule(self, loop):
+        if loop is not self.__loop:
+            return
+        self.__expected = loop.time() + self.interval
+        loop.call_later(self.interval, self.__tick, loop)
+
+    def __tick(self, loop):
+        self.last = max(loop.time() - self.__expected, 0)
+        self.histogram.observe(self.last)
+        self.__schedule(loop)
+
+
+registry = Registry()
+exporter = MetricsExporter(registry)
+
+REQUEST_DURATION = registry.register(
+    Histogram(
+        "receptor_satellite_request_duration_seconds",
+        "Duration of requests to Satellite",
+        ["endpoint"],
+    )
+)
+REQUEST_ERRORS = registry.register(
+    Counter(
+        "receptor_satellite_request_errors_total",
+        "Requests to Satellite which failed or returned an error status",
+        ["endpoint"],
+    )
+)
+REQUEST_TIMEOUTS = registry.register(
+    Counter(
+        "receptor_satellite_request_timeouts_total",
+        "Requests to Satellite which timed out, also counted as request errors",
+        ["endpoint"],
+    )
+)
+POLL_ERRORS = registry.register(
+    Counter(
+        "receptor_satellite_poll_errors_total",
+        "Failed output polls, by reason",
+        ["reason"],
+    )
+)
+POLL_RETRIES_EXHAUSTED = registry.register(
+    Counter(
+        "receptor_satellite_poll_retries_exhausted_total",
+        "Hosts marked as failed after running out of output poll retries",
+    )
+)
+ACTIVE_RUNS = registry.register(
+    Gauge("receptor_satellite_active_runs", "Playbook runs currently in progress")
+)
+REGISTERED_RUNS = registry.register(
+    Gauge(
+        "receptor_satellite_registered_runs",
+        "Runs known to the run registry, live or tombstoned after finishing",
+        ["state"],
+    )
+)
+QUEUED_RUNS = registry.register(
+    Gauge(
+        "receptor_satellite_queued_runs",
+        "Triggered playbook runs waiting for polling capacity",
+    )
+)
+QUEUED_HOSTS = registry.register(
+    Gauge(
+        "receptor_satellite_queued_hosts",
+        "Hosts of playbook runs waiting for polling capacity",
+    )
+)
+ACTIVE_HOSTS = registry.register(
+    Gauge("receptor_satellite_active_hosts", "Hosts currently being polled")
+)
+MESSAGES = registry.register(
+    Counter(
+        "receptor_satellite_messages_total",
+        "Messages sent back to receptor, by type",
+        ["type"],
+    )
+)
+CONSOLE_CHARACTERS = registry.register(
+    Counter(
+        "receptor_satellite_console_characters_total",
+        "Characters of console output sent back to receptor",
+    )
+)
+EVENT_LOOP_LAG = registry.register(
+    Histogram(
+        "receptor_satellite_event_loop_lag_seconds",
+        "Delay of a periodic timer in the worker's event loop",
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    )
+)
+DECODED_IN_EXECUTOR = registry.register(
+    Counter(
+        "receptor_satellite_decoded_in_executor_total",
+        "Response bodies decoded in a worker thread because of their size",
+        ["endpoint"],
+    )
+)
+
+loop_lag = LoopLagMonitor(EVENT_LOOP_LAG)
@@ -0,0 +1,162 @@
+import json
+
+WHITESPACE = " \t\n\r"
+NUMBER = "0123456789.eE+-"
+
+_INCOMPLETE = object()
+
+
+class OutputStreamParser:
+    """Incrementally parses bodies of the host output endpoint.
+
+    Text is fed as it is received. Elements of the top level "output"
+    array are decoded one by one as soon as they are complete, so the body
+    is never held in memory as a whole, neither as bytes nor as a string.
+    Other top level values are decoded whole.
+    """
+
+    OUTPUT_KEY = "output"
+
+    def __init__(self):
+        self.body = {}
+        self.__decoder = json.JSONDecoder()
+        self.__buffer = ""
+        self.__position = 0
+        self.__key = None
+        # Unparsed characters to wait for before decoding a value again
+        self.__needed = 0
+        self.__state = self.__start
+
+    def feed(self, text):
+        self.__buffer = self.__buffer[self.__position :] + text
+        self.__position = 0
+        self.__parse(False)
+
+    def close(self):
+        self.__parse(True)
+        if self.__state != self.__end:
+            raise ValueError("Output body ended unexpectedly")
+        self.__buffer = ""
+        return self.body
+
+    def __parse(self, final):
+        while self.__state(final):
+            pass
+
+    def __next_char(self):
+        buffer = self.__buffer
+        position = self.__position
+        while position < len(buffer) and buffer[position] in WHITESPACE:
+            position += 1
+        self.__position = position
+        return buffer[position] if position < len(buffer) else None
+
+    def __expect(self, allowed):
+        char = self.__next_char()
+        if char is not None and char not in allowed:
+            raise ValueError(f"Unexpected '{char}' in output body")
+        if char is not None:
+            self.__position += 1
+        return char
+
+    def __decode(self, final):
+        if self.__next_char() is None:
+            return _INCOMPLETE
+        buffer = self.__buffer
+        if not final and len(buffer) - self.__position < self.__needed:
+            return _INCOMPLETE
+        try:
+            value, end = self.__decoder.raw_decode(buffer, self.__position)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            # Wait for the unparsed part to double before trying again,
+            # large values arriving in small pieces are not parsed over
+            # and over again
+            self.__needed = 2 * (len(buffer) - self.__position)
+            return _INCOMPLETE
+        # A number or literal might continue in the next piece, a number is
+        # also cut short when only a part of its fraction or exponent arrived
+        if not final and buffer[end - 1] not in '"]}':
+            if not buffer[end:].lstrip(NUMBER):
+                return _INCOMPLETE
+        self.__position = end
+        self.__needed = 0
+        return value
+
+    def __start(self, _final):
+        if self.__expect("{") is None:
+            return False
+        self.__state = self.__key_or_end
+        return True
+
+    def __key_or_end(self, final):
+        if self.__next_char() == "}":
+            self.__position += 1
+            self.__state = self.__end
+            return True
+        key = self.__decode(final)
+        if key is _INCOMPLETE:
+            return False
+        self.__key = key
+        self.__state = self.__colon
+        return True
+
+    def __colon(self, _final):
+        if self.__expect(":") is None:
+            return False
+        self.__state = self.__value
+        if self.__key == self.OUTPUT_KEY:
+            self.__state = self.__array_start
+        return True
+
+    def __value(self, final):
+        value = self.__decode(final)
+        if value is _INCOMPLETE:
+            return False
+        self.body[self.__key] = value
+        self.__state = self.__object_next
+        return True
+
+    def __array_start(self, _final):
+        char = self.__next_char()
+        if char is None:
+            return False
+        if char != "[":
+            self.__state = self.__value
+            return True
+        self.__position += 1
+        self.body[self.__key] = []
+        self.__state = self.__element_or_end
+        return True
+
+    def __element_or_end(self, final):
+        if self.__next_char() == "]":
+            self.__position += 1
+            self.__state = self.__object_next
+            return True
+        element = self.__decode(final)
+        if element is _INCOMPLETE:
+            return False
+        self.body[self.__key].append(element)
+        self.__state = self.__element_next
+        return True
+
+    def __element_next(self, _final):
+        char = self.__expect(",]")
+        if char is None:
+            return False
+        self.__state = self.__element_or_end if char == "," else self.__object_next
+        return True
+
+    def __object_next(self, _final):
+        char = self.__expect(",}")
+        if char is None:
+            return False
+        self.__state = self.__key_or_end if char == "," else self.__end
+        return True
+
+    def __end(self, _final):
+        if self.__next_char() is not None:
+            raise ValueError("Unexpected data after output body")
+        return False
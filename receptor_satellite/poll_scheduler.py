@@ -0,0 +1,100 @@
+import asyncio
+import heapq
+import itertools
+
+from . import metrics
+
+
+class PollScheduler:
+    """Drives output polling for all hosts of a single run.
+
+    Instead of every host sleeping and polling on its own, hosts are kept
+    in a schedule ordered by the time they are next due. Due hosts are
+    handed over through a bounded work queue to a fixed number of workers,
+    so at most `concurrency` requests are in flight at any time. The first
+    round of polls is spread evenly across the polling interval, which
+    keeps the request rate flat instead of bursting once per interval.
+
+    Once per interval the run is asked to refresh the task state of its
+    hosts from the job invocation summary, letting hosts skip fetching
+    output while nothing has changed, and to checkpoint its progress.
+    """
+
+    def __init__(self, run, hosts, interval, concurrency):
+        self.run = run
+        self.interval = interval
+        self.concurrency = concurrency
+        self.active = 0
+        self.__counter = itertools.count()
+        self.__schedule = []
+        self.__hosts = hosts
+
+    def schedule(self, host, delay):
+        loop = asyncio.get_event_loop()
+        heapq.heappush(
+            self.__schedule, (loop.time() + delay, next(self.__counter), host)
+        )
+
+    async def start(self):
+        self.__queue = asyncio.Queue(maxsize=self.concurrency)
+        self.__wakeup = asyncio.Event()
+        count = len(self.__hosts)
+        for index, host in enumerate(self.__hosts):
+            self.schedule(host, self.interval * (index + 1) / count)
+        self.active = count
+        metrics.ACTIVE_HOSTS.inc(count)
+        workers = [
+            asyncio.ensure_future(self.__work()) for _ in range(self.concurrency)
+        ]
+        try:
+            await self.__dispatch()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            metrics.ACTIVE_HOSTS.dec(self.active)
+
+    async def __dispatch(self):
+        loop = asyncio.get_event_loop()
+        next_refresh = loop.time()
+        while self.active:
+            self.__wakeup.clear()
+            if next_refresh <= loop.time():
+                await self.run.refresh_host_statuses()
+                await self.run.checkpoint()
+                next_refresh = loop.time() + self.interval
+            while self.__schedule and self.__schedule[0][0] <= loop.time():
+                _, _, host = heapq.heappop(self.__schedule)
+                await self.run.queue.wait_for_capacity()
+                await self.__queue.put(host)
+            due = next_refresh
+            if self.__schedule:
+                due = min(due, self.__schedule[0][0])
+            timeout = max(due - loop.time(), 0)
+            try:
+                await asyncio.wait_for(self.__wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def __work(self):
+        while True:
+            host = await self.__queue.get()
+            try:
+                done = await host.poll()
+            except asyncio.CancelledError:
+                # Still a subclass of Exception before Python 3.8
+                raise
+            except Exception as e:
+                self.run.logger.error(
+                    f"Polling host {host.name} in playbook run {self.run.playbook_run_id} failed: {e}"
+                )
+                host.mark_as_failed(str(e))
+                done = True
+            finally:
+                self.__queue.task_done()
+            if done:
+                self.active -= 1
+                metrics.ACTIVE_HOSTS.dec()
+                self.run.host_done()
+            else:
+                self.schedule(host, host.next_poll_delay())
+            self.__wakeup.set()
@@ -0,0 +1,120 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class RateLimiter:
+    """Bounds the requests sent to a single Satellite.
+
+    At most `max_in_flight` requests run at the same time and, if
+    `rate` is set, new requests start at no more than `rate` per second
+    (token bucket allowing bursts of up to `rate` requests). Waiting
+    requests are admitted in order of priority, then arrival.
+    """
+
+    def __init__(self, rate=None, max_in_flight=None, clock=time.monotonic):
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.clock = clock
+        self.in_flight = 0
+        self.__tokens = rate or 0
+        self.__updated_at = clock()
+        self.__waiters = []
+        self.__counter = itertools.count()
+        self.__timer = None
+
+    @property
+    def waiting(self):
+        return len(self.__waiters)
+
+    def configure(self, rate, max_in_flight):
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        # Raised limits may make room for waiting requests
+        self.__process()
+
+    def slot(self, priority=PRIORITY_NORMAL):
+        return _Slot(self, priority)
+
+    async def acquire(self, priority=PRIORITY_NORMAL):
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self.__waiters, (priority, next(self.__counter), future))
+        self.__process()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self.__process()
+
+    def __refill(self):
+        now = self.clock()
+        if self.rate:
+            elapsed = now - self.__updated_at
+            self.__tokens = min(self.rate, self.__tokens + elapsed * self.rate)
+        self.__updated_at = now
+
+    def __process(self):
+        self.__refill()
+        while self.__waiters:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                return
+            if self.rate and self.__tokens < 1:
+                self.__schedule_refill()
+                return
+            _, _, future = heapq.heappop(self.__waiters)
+            if future.done():
+                continue
+            if self.rate:
+                self.__tokens -= 1
+            self.in_flight += 1
+            future.set_result(None)
+
+    def __schedule_refill(self):
+        if self.__timer is not None:
+            return
+        delay = (1 - self.__tokens) / self.rate
+        self.__timer = asyncio.get_event_loop().call_later(delay, self.__refilled)
+
+    def __refilled(self):
+        self.__timer = None
+        self.__process()
+
+
+class _Slot:
+    def __init__(self, limiter, priority):
+        self.limiter = limiter
+        self.priority = priority
+
+    async def __aenter__(self):
+        await self.limiter.acquire(self.priority)
+
+    async def __aexit__(self, *_exc):
+        self.limiter.release()
+
+
+class RateLimiters:
+    """One RateLimiter per Satellite URL, shared by the whole worker."""
+
+    def __init__(self):
+        self.__limiters = {}
+
+    def get(self, url, rate, max_in_flight):
+        # Called from receptor's threads, limiters already in use are only
+        # reconfigured from the event loop
+        limiter = self.__limiters.get(url)
+        if limiter is None:
+            limiter = self.__limiters[url] = RateLimiter(rate, max_in_flight)
+        return limiter
+
+
+rate_limiters = RateLimiters()
@@ -1,4 +1,23 @@
+import asyncio
+from collections import deque
+from queue import Full
+
+from . import metrics
+
+
 class ResponseQueue:
+    """Sends messages back to receptor.
+
+    Without `max_pending` messages are put on the queue right away. With
+    it, messages are staged in an ordered buffer and moved to the queue
+    only while fewer than `max_pending` messages on it wait to be consumed.
+    Receptor's queue is unbounded, its size is what tells a slow consumer
+    apart. While staged, a coalescable console update is replaced by a
+    newer update for the same host, other messages are never dropped.
+    Producers should wait for capacity once `max_pending` messages are
+    staged.
+    """
+
     RESULT_SUCCESS = "success"
     RESULT_FAILURE = "failure"
     RESULT_CANCEL = "canceled"
@@ -7,35 +26,99 @@ class ResponseQueue:
     CANCEL_RESULT_FAILURE = RESULT_FAILURE
     CANCEL_RESULT_FINISHED = "finished"
 
-    def __init__(self, queue):
+    def __init__(self, queue, max_pending=None):
         self.queue = queue
+        self.max_pending = max_pending
+        self.dropped = 0
+        self.__pending = deque()
+        self.__latest = {}
+
+    @property
+    def depth(self):
+        return len(self.__pending)
+
+    def full(self):
+        return self.max_pending is not None and self.depth >= self.max_pending
+
+    def __put(self, message, key=None, coalesce=False):
+        metrics.MESSAGES.inc(type=message["type"])
+        if "console" in message:
+            # Encoding full text updates to count bytes would cost as much
+            # as the whole console on every update
+            metrics.CONSOLE_CHARACTERS.inc(len(message["console"]))
+        if self.max_pending is None:
+            self.queue.put(message)
+            return
+        cell = self.__latest.get(key)
+        if coalesce and cell is not None:
+            cell[0] = message
+            self.dropped += 1
+        else:
+            cell = [message]
+            self.__pending.append(cell)
+            # Anything after a non-coalescable message must stay behind it
+            if coalesce:
+                self.__latest[key] = cell
+            else:
+                self.__latest.pop(key, None)
+        self.flush()
+
+    def flush(self):
+        while self.__pending and self.queue.qsize() < self.max_pending:
+            cell = self.__pending[0]
+            try:
+                self.queue.put_nowait(cell[0])
+            except Full:
+                break
+            self.__pending.popleft()
+            message = cell[0]
+            key = (message["playbook_run_id"], message.get("host"))
+            if self.__latest.get(key) is cell:
+                del self.__latest[key]
+
+    async def wait_for_capacity(self, interval=0.1):
+        self.flush()
+        while self.full():
+            await asyncio.sleep(interval)
+            self.flush()
+
+    async def drain(self, interval=0.1):
+        self.flush()
+        while self.__pending:
+            await asyncio.sleep(interval)
+            self.flush()
 
     def ack(self, playbook_run_id):
-        self.queue.put({"type": "playbook_run_ack", "playbook_run_id": playbook_run_id})
+        self.__put({"type": "playbook_run_ack", "playbook_run_id": playbook_run_id})
 
-    def playbook_run_update(self, host, playbook_run_id, output, sequence):
-        self.queue.put(
+    def playbook_run_update(
+        self, host, playbook_run_id, output, sequence, coalesce=False
+    ):
+        self.__put(
             {
                 "type": "playbook_run_update",
                 "playbook_run_id": playbook_run_id,
                 "sequence": sequence,
                 "host": host,
                 "console": output,
-            }
+            },
+            (playbook_run_id, host),
+            coalesce,
         )
 
     def playbook_run_finished(self, host, playbook_run_id, result=RESULT_SUCCESS):
-        self.queue.put(
+        self.__put(
             {
                 "type": "playbook_run_finished",
                 "playbook_run_id": playbook_run_id,
                 "host": host,
                 "status": result,
-            }
+            },
+            (playbook_run_id, host),
         )
 
     def playbook_run_cancel_ack(self, playbook_run_id, status):
-        self.queue.put(
+        self.__put(
             {
                 "type": "playbook_run_cancel_ack",
                 "playbook_run_id": playbook_run_id,
@@ -1,26 +1,88 @@
 import asyncio
+import time
+from collections import OrderedDict
+
+from . import metrics
 
 
 class RunMonitor:
-    def __init__(self):
+    """Keeps track of runs in progress and recently finished runs.
+
+    Finished runs are only remembered as tombstones, which are evicted
+    once they are older than `ttl` seconds or when there are more than
+    `capacity` of them, oldest first.
+    """
+
+    DEFAULT_CAPACITY = 10000
+    DEFAULT_TTL = 24 * 60 * 60
+
+    def __init__(
+        self, capacity=DEFAULT_CAPACITY, ttl=DEFAULT_TTL, clock=time.monotonic
+    ):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
         self.__runs = {}
-        self.__lock = asyncio.Lock()
+        self.__finished = OrderedDict()
+        self.__lock = None
+
+    @property
+    def _lock(self):
+        # Created lazily so the lock belongs to the worker's event loop
+        if self.__lock is None:
+            self.__lock = asyncio.Lock()
+        return self.__lock
+
+    @property
+    def live(self):
+        return len(self.__runs)
+
+    @property
+    def tombstoned(self):
+        return len(self.__finished)
+
+    def configure(self, capacity=None, ttl=None):
+        if capacity is not None:
+            self.capacity = int(capacity)
+        if ttl is not None:
+            self.ttl = int(ttl)
 
     async def register(self, run):
-        async with self.__lock:
-            if run.playbook_run_id in self.__runs:
+        async with self._lock:
+            self.__evict()
+            playbook_run_id = run.playbook_run_id
+            if playbook_run_id in self.__runs or playbook_run_id in self.__finished:
                 return False
             else:
-                self.__runs[run.playbook_run_id] = run
+                self.__runs[playbook_run_id] = run
+                self.__update_metrics()
                 return True
 
     async def done(self, run):
-        async with self.__lock:
-            self.__runs[run.playbook_run_id] = True
+        async with self._lock:
+            self.__runs.pop(run.playbook_run_id, None)
+            self.__finished[run.playbook_run_id] = self.clock()
+            self.__evict()
 
     async def get(self, playbook_run_id):
-        async with self.__lock:
+        async with self._lock:
+            self.__evict()
+            if playbook_run_id in self.__finished:
+                return True
             return self.__runs.get(playbook_run_id)
 
+    def __evict(self):
+        expired_before = self.clock() - self.ttl
+        while self.__finished:
+            playbook_run_id, finished_at = next(iter(self.__finished.items()))
+            if finished_at > expired_before and len(self.__finished) <= self.capacity:
+                break
+            del self.__finished[playbook_run_id]
+        self.__update_metrics()
+
+    def __update_metrics(self):
+        metrics.REGISTERED_RUNS.set(self.live, state="live")
+        metrics.REGISTERED_RUNS.set(self.tombstoned, state="tombstoned")
+
 
 run_monitor = RunMonitor()
@@ -1,8 +1,19 @@
-import json
+import asyncio
+import codecs
+import os
 import ssl
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import aiohttp
 
+from . import codec, metrics
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .output_stream import OutputStreamParser
+from .rate_limiter import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, rate_limiters
 
 HEALTH_CHECK_OK = "ok"
 HEALTH_CHECK_ERROR = "error"
@@ -59,31 +70,257 @@ HEALTH_STATUS_RESULTS = {
 }
 
 
+class RequestTimeoutError(Exception):
+    def __init__(self, url):
+        super().__init__(f"Request to {url} timed out")
+
+
+# Decoding large bodies in the event loop would hold up every other
+# coroutine of the worker. The threads still share the GIL with the loop,
+# but the loop gets to run at least once per switch interval.
+decode_executor = ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix="receptor-satellite-decode"
+)
+
+
+async def in_executor(function, *args):
+    return await asyncio.get_event_loop().run_in_executor(
+        decode_executor, function, *args
+    )
+
+
+async def read_output(
+    response, decode_above=None, chunk_size=64 * 1024, stream_above=1024 * 1024
+):
+    # Streaming costs more CPU than decoding in one go, only bodies which
+    # are large or of unknown size are worth it
+    length = response.content_length
+    if length is not None and length <= stream_above:
+        data = await response.read()
+        if decode_above is not None and len(data) > decode_above:
+            metrics.DECODED_IN_EXECUTOR.inc(endpoint="output")
+            return await in_executor(codec.loads, data)
+        return codec.loads(data)
+    parser = OutputStreamParser()
+    decoder = codecs.getincrementaldecoder(response.charset or "utf-8")()
+    received = 0
+    offloaded = False
+    async for data in response.content.iter_chunked(chunk_size):
+        received += len(data)
+        text = decoder.decode(data)
+        if decode_above is not None and received > decode_above:
+            if not offloaded:
+                offloaded = True
+                metrics.DECODED_IN_EXECUTOR.inc(endpoint="output")
+            await in_executor(parser.feed, text)
+        else:
+            parser.feed(text)
+    parser.feed(decoder.decode(b"", final=True))
+    return parser.close()
+
+
+class SessionPool:
+    """Keeps one long-lived ClientSession per Satellite URL.
+
+    Sessions are tied to the event loop they were created in, a session
+    created in a different loop is replaced rather than reused.
+    """
+
+    def __init__(self):
+        self.__sessions = {}
+
+    def get(self, url, connector_options):
+        loop = asyncio.get_event_loop()
+        entry = self.__sessions.get(url)
+        if entry is not None:
+            session_loop, session = entry
+            if session_loop is loop and not session.closed:
+                return session
+        connector = aiohttp.TCPConnector(use_dns_cache=True, **connector_options)
+        session = aiohttp.ClientSession(connector=connector)
+        self.__sessions[url] = (loop, session)
+        return session
+
+    async def close(self):
+        sessions, self.__sessions = self.__sessions, {}
+        for _loop, session in sessions.values():
+            await session.close()
+
+
+session_pool = SessionPool()
+
+
+class SSLContextCache:
+    """Reuses SSL contexts across SatelliteAPI instances.
+
+    Loading a CA bundle is expensive, contexts are therefore cached per CA
+    file and certificate validation setting. A context is rebuilt when the
+    modification time of its CA file changes.
+    """
+
+    def __init__(self):
+        self.__contexts = {}
+        self.__lock = threading.Lock()
+
+    def get(self, ca_file, validate_cert):
+        mtime = os.stat(ca_file).st_mtime_ns if ca_file else None
+        key = (ca_file, validate_cert)
+        with self.__lock:
+            cached = self.__contexts.get(key)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            context = ssl.SSLContext()
+            if ca_file:
+                context.load_verify_locations(cafile=ca_file)
+            if validate_cert:
+                context.verify_mode = ssl.CERT_REQUIRED
+            self.__contexts[key] = (mtime, context)
+            return context
+
+
+ssl_contexts = SSLContextCache()
+
+# Shared by all SatelliteAPI instances talking to the same Satellite
+circuit_breakers = defaultdict(CircuitBreaker)
+
+
+class HealthCheckCache:
+    """Shares health check results between health check messages.
+
+    Results are kept per Satellite URL and instance id and reused while
+    they are younger than the TTL of the caller. Concurrent checks of the
+    same Satellite wait for the one already in flight instead of sending
+    requests of their own.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.__results = {}
+        self.__in_flight = {}
+
+    async def get(self, key, ttl, check):
+        cached = self.__results.get(key)
+        if cached is not None and cached[0] + ttl > self.clock():
+            return dict(cached[1])
+        future = self.__in_flight.get(key)
+        if future is None:
+            future = self.__in_flight[key] = asyncio.ensure_future(check())
+            future.add_done_callback(lambda done: self.__finished(key, done))
+        # Cancelling one of the waiting checks must not cancel the others
+        return dict(await asyncio.shield(future))
+
+    def __finished(self, key, future):
+        del self.__in_flight[key]
+        if not future.cancelled() and future.exception() is None:
+            self.__results[key] = (self.clock(), future.result())
+
+
+health_checks = HealthCheckCache()
+
+
 class SatelliteAPI:
-    def __init__(self, username, password, url, ca_file, validate_cert=True):
+    DEFAULT_CONNECTOR_OPTIONS = dict(
+        limit=100, limit_per_host=0, keepalive_timeout=60, ttl_dns_cache=300
+    )
+    DEFAULT_MAX_REQUESTS_IN_FLIGHT = 32
+    DEFAULT_HEALTH_CHECK_TTL = 30
+    # Bodies larger than this many bytes are decoded in decode_executor
+    DEFAULT_EXECUTOR_DECODE_THRESHOLD = 256 * 1024
+    ENDPOINTS = ("trigger", "output", "job_invocation", "cancel", "health")
+    # Seconds to wait for establishing a connection and between reads
+    DEFAULT_TIMEOUTS = dict(connect=10, read=60)
+
+    def __init__(
+        self,
+        username,
+        password,
+        url,
+        ca_file,
+        validate_cert=True,
+        connector_options=None,
+        requests_per_second=None,
+        max_requests_in_flight=DEFAULT_MAX_REQUESTS_IN_FLIGHT,
+        health_check_ttl=DEFAULT_HEALTH_CHECK_TTL,
+        timeouts=None,
+        executor_decode_threshold=DEFAULT_EXECUTOR_DECODE_THRESHOLD,
+    ):
         self.username = username
         self.password = password
         self.url = url
+        self.auth = aiohttp.BasicAuth(username, password)
+        self.connector_options = dict(
+            self.DEFAULT_CONNECTOR_OPTIONS, **(connector_options or {})
+        )
         self.context = None
         self.session = None
+        self.__session_users = 0
+        self.health_check_ttl = health_check_ttl
+        self.executor_decode_threshold = executor_decode_threshold
+        timeouts = timeouts or {}
+        self.timeouts = {}
+        for endpoint in self.ENDPOINTS:
+            timeout = dict(self.DEFAULT_TIMEOUTS, **timeouts.get(endpoint, {}))
+            self.timeouts[endpoint] = aiohttp.ClientTimeout(
+                total=None, sock_connect=timeout["connect"], sock_read=timeout["read"]
+            )
+        self.breaker = circuit_breakers[url]
+        self.requests_per_second = requests_per_second
+        self.max_requests_in_flight = max_requests_in_flight
+        self.limiter = rate_limiters.get(
+            url, requests_per_second, max_requests_in_flight
+        )
         if url.startswith("https"):
-            self.context = ssl.SSLContext()
-            if ca_file:
-                self.context.load_verify_locations(cafile=ca_file)
-            if validate_cert:
-                self.context.verify_mode = ssl.CERT_REQUIRED
+            self.context = ssl_contexts.get(ca_file, validate_cert)
 
     FALSE_VALUES = ["false", "no", "0", ""]
 
+    # plugin_config key -> aiohttp.TCPConnector argument
+    CONNECTOR_OPTIONS = dict(
+        connection_limit="limit",
+        connection_limit_per_host="limit_per_host",
+        keepalive_timeout="keepalive_timeout",
+        dns_cache_ttl="ttl_dns_cache",
+    )
+
     @classmethod
     def from_plugin_config(cls, plugin_config):
         validate_cert = plugin_config.get("validate_cert")
+        connector_options = {
+            option: int(plugin_config[key])
+            for key, option in cls.CONNECTOR_OPTIONS.items()
+            if plugin_config.get(key) is not None
+        }
+        requests_per_second = plugin_config.get("requests_per_second")
+        max_requests_in_flight = plugin_config.get(
+            "max_requests_in_flight", cls.DEFAULT_MAX_REQUESTS_IN_FLIGHT
+        )
+        health_check_ttl = plugin_config.get(
+            "health_check_ttl", cls.DEFAULT_HEALTH_CHECK_TTL
+        )
+        executor_decode_threshold = plugin_config.get(
+            "executor_decode_threshold", cls.DEFAULT_EXECUTOR_DECODE_THRESHOLD
+        )
+        # <endpoint>_<kind>_timeout overrides <kind>_timeout
+        timeouts = {}
+        for endpoint in cls.ENDPOINTS:
+            for kind in cls.DEFAULT_TIMEOUTS:
+                value = plugin_config.get(
+                    f"{endpoint}_{kind}_timeout", plugin_config.get(f"{kind}_timeout")
+                )
+                if value is not None:
+                    timeouts.setdefault(endpoint, {})[kind] = float(value)
         return cls(
             plugin_config["username"],
             plugin_config["password"],
             plugin_config["url"],
             plugin_config.get("ca_file"),
             False if validate_cert in cls.FALSE_VALUES else True,
+            connector_options,
+            None if requests_per_second is None else float(requests_per_second),
+            None if max_requests_in_flight is None else int(max_requests_in_flight),
+            float(health_check_ttl),
+            timeouts,
+            int(executor_decode_threshold),
         )
 
     async def trigger(self, inputs, hosts):
@@ -95,24 +332,46 @@ class SatelliteAPI:
             }
         }
         url = f"{self.url}/api/v2/job_invocations"
-        extra_data = {"json": payload, "headers": {"Content-Type": "application/json"}}
-        response = await self.request("POST", url, extra_data)
+        extra_data = {
+            "data": codec.dumps(payload),
+            "headers": {"Content-Type": "application/json"},
+        }
+        response = await self.call("trigger", "POST", url, extra_data)
         return sanitize_response(response, [201])
 
-    async def output(self, job_invocation_id, host_id, since):
+    async def output(self, job_invocation_id, host_id, since, final=False):
         url = "{}/api/v2/job_invocations/{}/hosts/{}".format(
             self.url, job_invocation_id, host_id
         )
-        extra_data = {"auth": aiohttp.BasicAuth(self.username, self.password)}
+        extra_data = {}
         if since is not None:
             extra_data["params"] = {"since": str(since)}
-        response = await self.request("GET", url, extra_data)
+        if not self.breaker.allow():
+            return dict(error=CircuitOpenError(self.url), body={}, status=-1)
+        # Routine text update polls give way to everything else
+        priority = PRIORITY_HIGH if final else PRIORITY_LOW
+        reader = partial(read_output, decode_above=self.executor_decode_threshold)
+        response = await self.call("output", "GET", url, extra_data, priority, reader)
+        if response["status"] == -1 or response["status"] >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return sanitize_response(response, [200])
+
+    async def job_invocation(self, job_invocation_id):
+        url = f"{self.url}/api/v2/job_invocations/{job_invocation_id}"
+        extra_data = {"params": {"host_status": "true"}}
+        response = await self.call("job_invocation", "GET", url, extra_data)
         return sanitize_response(response, [200])
 
     async def cancel(self, job_invocation_id):
         url = f"{self.url}/api/v2/job_invocations/{job_invocation_id}/cancel"
-        response = await self.request(
-            "POST", url, {"headers": {"Content-Type": "application/json"}}
+        response = await self.call(
+            "cancel",
+            "POST",
+            url,
+            {"headers": {"Content-Type": "application/json"}},
+            PRIORITY_HIGH,
         )
         return sanitize_response(response, [200, 422])
 
@@ -124,75 +383,139 @@ class SatelliteAPI:
         return to_return
 
     async def health_check(self, satellite_instance_id):
+        return await health_checks.get(
+            (self.url, satellite_instance_id),
+            self.health_check_ttl,
+            lambda: self.probe_health(satellite_instance_id),
+        )
+
+    async def probe_health(self, satellite_instance_id):
         await self.init_session()
         try:
-            # Ensure that the Foreman UUID matches the addressed one
-            url = f"{self.url}/api/settings?search=name%20%3D%20instance_id"
-            response = await self.request("GET", url, {})
-            status = sanitize_response(response, [200])
-            if status["error"]:
-                if status["status"] == -1:
-                    return self.health_check_response(HEALTH_NO_CONNECTION, status)
-                return self.health_check_response(HEALTH_BAD_HTTP_STATUS, status)
-            try:
-                gathered_id = status["body"]["results"][0]["value"]
-            except (IndexError, KeyError):
-                return self.health_check_response(HEALTH_UUID_UNKNOWN)
-            if satellite_instance_id.lower() != gathered_id.lower():
-                return self.health_check_response(
-                    HEALTH_UUID_MISMATCH, dict(uuid=gathered_id)
-                )
-
-            # Ensure that the Foreman has at least one working smart proxy with Ansible
-            url = f"{self.url}/api/statuses"
-            response = await self.request("GET", url, {})
-            status = sanitize_response(response, [200])
-            if status["error"]:
-                if status["status"] == -1:
-                    return self.health_check_response(HEALTH_NO_CONNECTION, status)
-                else:
-                    return self.health_check_response(HEALTH_BAD_HTTP_STATUS, status)
-            try:
-                ansible_proxies = [
-                    sp
-                    for sp in status["body"]["results"]["foreman"]["smart_proxies"]
-                    if "ansible" in sp["features"]
-                ]
-            except KeyError:
-                return self.health_check_response(HEALTH_SP_UNKNOWN)
-            else:
-                if not ansible_proxies:
-                    return self.health_check_response(HEALTH_SP_NO_ANSIBLE)
-                ok_proxies = [sp for sp in ansible_proxies if sp["status"] == "ok"]
-                if not ok_proxies:
-                    return self.health_check_response(HEALTH_SP_OFFLINE)
-
-            return self.health_check_response(HEALTH_OK)
+            # Both stages are probed at once, the instance id check still
+            # takes precedence when deciding about the result
+            timings = {}
+            uuid_status, statuses_status = await asyncio.gather(
+                self.probe_stage(
+                    "instance_id",
+                    f"{self.url}/api/settings?search=name%20%3D%20instance_id",
+                    timings,
+                ),
+                self.probe_stage("smart_proxies", f"{self.url}/api/statuses", timings),
+            )
+            result = self.check_instance_id(satellite_instance_id, uuid_status)
+            if result is None:
+                result = self.check_smart_proxies(statuses_status)
+            if result is None:
+                result = self.health_check_response(HEALTH_OK)
+            result["timings"] = timings
+            return result
         finally:
             await self.close_session()
 
-    async def request(self, method, url, extra_data):
+    async def probe_stage(self, stage, url, timings):
+        started = time.monotonic()
+        response = await self.call("health", "GET", url, {})
+        timings[stage] = round(time.monotonic() - started, 3)
+        return sanitize_response(response, [200])
+
+    def check_request_status(self, status):
+        if status["status"] == -1:
+            return self.health_check_response(HEALTH_NO_CONNECTION, status)
+        return self.health_check_response(HEALTH_BAD_HTTP_STATUS, status)
+
+    def check_instance_id(self, satellite_instance_id, status):
+        # Ensure that the Foreman UUID matches the addressed one
+        if status["error"]:
+            return self.check_request_status(status)
+        try:
+            gathered_id = status["body"]["results"][0]["value"]
+        except (IndexError, KeyError):
+            return self.health_check_response(HEALTH_UUID_UNKNOWN)
+        if satellite_instance_id.lower() != gathered_id.lower():
+            return self.health_check_response(
+                HEALTH_UUID_MISMATCH, dict(uuid=gathered_id)
+            )
+        return None
+
+    def check_smart_proxies(self, status):
+        # Ensure that the Foreman has at least one working smart proxy with Ansible
+        if status["error"]:
+            return self.check_request_status(status)
+        try:
+            ansible_proxies = [
+                sp
+                for sp in status["body"]["results"]["foreman"]["smart_proxies"]
+                if "ansible" in sp["features"]
+            ]
+        except KeyError:
+            return self.health_check_response(HEALTH_SP_UNKNOWN)
+        if not ansible_proxies:
+            return self.health_check_response(HEALTH_SP_NO_ANSIBLE)
+        ok_proxies = [sp for sp in ansible_proxies if sp["status"] == "ok"]
+        if not ok_proxies:
+            return self.health_check_response(HEALTH_SP_OFFLINE)
+        return None
+
+    async def call(
+        self, endpoint, method, url, extra_data, priority=PRIORITY_NORMAL, reader=None
+    ):
+        extra_data["timeout"] = self.timeouts[endpoint]
+        async with self.limiter.slot(priority):
+            started = time.monotonic()
+            response = await self.request(method, url, extra_data, reader)
+        metrics.REQUEST_DURATION.observe(time.monotonic() - started, endpoint=endpoint)
+        if response["error"] or response["status"] >= 400:
+            metrics.REQUEST_ERRORS.inc(endpoint=endpoint)
+        if isinstance(response["error"], RequestTimeoutError):
+            metrics.REQUEST_TIMEOUTS.inc(endpoint=endpoint)
+        body = response["body"]
+        large = isinstance(body, str) and len(body) > self.executor_decode_threshold
+        if large and not response["error"]:
+            metrics.DECODED_IN_EXECUTOR.inc(endpoint=endpoint)
+            response["body"] = await in_executor(codec.loads, body)
+        return response
+
+    async def request(self, method, url, extra_data, reader=None):
         try:
             extra_data["ssl"] = self.context
+            extra_data.setdefault("auth", self.auth)
             async with self.session.request(method, url, **extra_data) as response:
-                return dict(
-                    status=response.status, body=await response.text(), error=None
-                )
+                # Successful responses may be decoded while they are received
+                if reader is not None and response.status == 200:
+                    body = await reader(response)
+                else:
+                    body = await response.text()
+                return dict(status=response.status, body=body, error=None)
+        except asyncio.TimeoutError:
+            return dict(error=RequestTimeoutError(url), body="{}", status=-1)
+        except asyncio.CancelledError:
+            # Still a subclass of Exception before Python 3.8, a cancelled
+            # request is neither an error nor a failure of Satellite
+            raise
         except Exception as e:
             return dict(error=e, body="{}", status=-1)
 
     async def init_session(self):
-        auth = aiohttp.BasicAuth(self.username, self.password)
-        self.session = aiohttp.ClientSession(auth=auth)
+        # Runs resumed after a restart share the instance of the run they
+        # were started with, the session is kept until the last one is done
+        self.__session_users += 1
+        self.session = session_pool.get(self.url, self.connector_options)
+        # The limiter is shared with requests in flight, the most recently
+        # received plugin configuration is applied to it from the loop
+        self.limiter.configure(self.requests_per_second, self.max_requests_in_flight)
 
     async def close_session(self):
-        await self.session.close()
-        self.session = None
+        # The session is owned by the pool and stays open for reuse
+        self.__session_users = max(self.__session_users - 1, 0)
+        if not self.__session_users:
+            self.session = None
 
 
 def sanitize_response(response, expected_statuses):
     if not response["error"]:
-        response["body"] = json.loads(response["body"])
+        if isinstance(response["body"], str):
+            response["body"] = codec.loads(response["body"])
         if not response["status"] in expected_statuses:
             response["error"] = response["body"]["error"]["message"]
     return response
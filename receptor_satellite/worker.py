@@ -1,10 +1,24 @@
 import asyncio
-import json
+import atexit
 import logging
-
-from .satellite_api import SatelliteAPI, HEALTH_CHECK_ERROR, HEALTH_STATUS_RESULTS
+import random
+
+from . import codec, metrics
+from .circuit_breaker import CircuitOpenError
+from .event_loop import event_loop
+from .satellite_api import (
+    SatelliteAPI,
+    HEALTH_CHECK_ERROR,
+    HEALTH_STATUS_RESULTS,
+    RequestTimeoutError,
+    session_pool,
+)
 from .response_queue import ResponseQueue
 from .run_monitor import run_monitor
+from .admission import admission
+from .poll_scheduler import PollScheduler
+from .checkpoint import checkpoint_stores, in_executor
+from .console_buffer import ConsoleBuffer
 
 
 def receptor_export(func):
@@ -35,18 +49,57 @@ class Config:
         TEXT_UPDATES = False
         TEXT_UPDATE_INTERVAL = 5000
         TEXT_UPDATE_FULL = True
+        POLLING_CONCURRENCY = 16
+        TRIGGER_BATCH_SIZE = 1000
+        ADAPTIVE_POLLING = False
+        ADAPTIVE_POLLING_MIN_INTERVAL = 1000
+        ADAPTIVE_POLLING_MAX_INTERVAL = 60000
+        RUN_TIMEOUT = None
+        OUTAGE_TIMEOUT = 900
 
-    def __init__(self, text_updates, text_update_interval, text_update_full):
+    def __init__(
+        self,
+        text_updates,
+        text_update_interval,
+        text_update_full,
+        polling_concurrency,
+        trigger_batch_size,
+        adaptive_polling,
+        adaptive_polling_min_interval,
+        adaptive_polling_max_interval,
+        run_timeout,
+        outage_timeout,
+    ):
         self.text_updates = text_updates
         self.text_update_interval = (
             text_update_interval // 1000
         )  # Store the interval in seconds
         self.text_update_full = text_update_full
+        self.polling_concurrency = polling_concurrency
+        self.trigger_batch_size = trigger_batch_size
+        self.adaptive_polling = adaptive_polling
+        # Store the bounds in seconds
+        self.adaptive_polling_min_interval = adaptive_polling_min_interval / 1000
+        self.adaptive_polling_max_interval = adaptive_polling_max_interval / 1000
+        # Seconds after which the run gives up on hosts still running
+        self.run_timeout = run_timeout
+        # Seconds a host may go without a successful poll while the circuit
+        # breaker holds its polls back
+        self.outage_timeout = outage_timeout
 
     @classmethod
     def from_raw(cls, raw={}):
         return cls(
-            raw["text_updates"], raw["text_update_interval"], raw["text_update_full"]
+            raw["text_updates"],
+            raw["text_update_interval"],
+            raw["text_update_full"],
+            raw["polling_concurrency"],
+            raw["trigger_batch_size"],
+            raw["adaptive_polling"],
+            raw["adaptive_polling_min_interval"],
+            raw["adaptive_polling_max_interval"],
+            raw["run_timeout"],
+            raw["outage_timeout"],
         )
 
     @classmethod
@@ -54,6 +107,13 @@ class Config:
         text_updates = raw.get("text_updates")
         text_update_interval = raw.get("text_update_interval")
         text_update_full = raw.get("text_update_full")
+        polling_concurrency = raw.get("polling_concurrency")
+        trigger_batch_size = raw.get("trigger_batch_size")
+        adaptive_polling = raw.get("adaptive_polling")
+        min_interval = raw.get("adaptive_polling_min_interval")
+        run_timeout = raw.get("run_timeout")
+        outage_timeout = raw.get("outage_timeout")
+        max_interval = raw.get("adaptive_polling_max_interval")
 
         validated = {}
         validated["text_updates"] = validate(
@@ -77,18 +137,136 @@ class Config:
             f"Expected the value of text_update_interval '{text_update_interval}' to be an integer greater or equal than 5000",
             logger,
         )
+        validated["polling_concurrency"] = validate(
+            lambda val: type(val) == int and val >= 1,
+            polling_concurrency,
+            Config.Defaults.POLLING_CONCURRENCY,
+            f"Expected the value of polling_concurrency '{polling_concurrency}' to be a positive integer",
+            logger,
+        )
+        validated["trigger_batch_size"] = validate(
+            lambda val: type(val) == int and val >= 1,
+            trigger_batch_size,
+            Config.Defaults.TRIGGER_BATCH_SIZE,
+            f"Expected the value of trigger_batch_size '{trigger_batch_size}' to be a positive integer",
+            logger,
+        )
+        validated["adaptive_polling"] = validate(
+            lambda val: type(val) == bool,
+            adaptive_polling,
+            Config.Defaults.ADAPTIVE_POLLING,
+            f"Expected the value of adaptive_polling '{adaptive_polling}' to be a boolean",
+            logger,
+        )
+        validated["adaptive_polling_min_interval"] = validate(
+            lambda val: type(val) == int and val >= 1000,
+            min_interval,
+            Config.Defaults.ADAPTIVE_POLLING_MIN_INTERVAL,
+            f"Expected the value of adaptive_polling_min_interval '{min_interval}' to be an integer greater or equal than 1000",
+            logger,
+        )
+        validated_min = validated["adaptive_polling_min_interval"]
+        validated["adaptive_polling_max_interval"] = validate(
+            lambda val: type(val) == int and val >= validated_min,
+            max_interval,
+            max(Config.Defaults.ADAPTIVE_POLLING_MAX_INTERVAL, validated_min),
+            f"Expected the value of adaptive_polling_max_interval '{max_interval}' to be an integer greater or equal than adaptive_polling_min_interval",
+            logger,
+        )
+        validated["run_timeout"] = validate(
+            lambda val: type(val) == int and val > 0,
+            run_timeout,
+            Config.Defaults.RUN_TIMEOUT,
+            f"Expected the value of run_timeout '{run_timeout}' to be a positive integer",
+            logger,
+        )
+        validated["outage_timeout"] = validate(
+            lambda val: type(val) == int and val > 0,
+            outage_timeout,
+            Config.Defaults.OUTAGE_TIMEOUT,
+            f"Expected the value of outage_timeout '{outage_timeout}' to be a positive integer",
+            logger,
+        )
         return validated
 
 
 class Host:
+    MAX_RETRIES = 5
+    MAX_BACKOFF = 60
+
+    JOB_STATUS_PENDING = "pending"
+    JOB_STATUS_RUNNING = "running"
+
+    # Runs can have tens of thousands of hosts, slots keep each one small
+    __slots__ = (
+        "run",
+        "id",
+        "name",
+        "job_invocation_id",
+        "interval",
+        "sequence",
+        "since",
+        "retries",
+        "last_success",
+        "output",
+        "emitted",
+        "emitted_length",
+        "resume_length",
+        "done",
+        "job_status",
+        "polled_status",
+    )
+
     def __init__(self, run, id, name):
         self.run = run
         self.id = id
         self.name = name
+        self.job_invocation_id = None
+        self.interval = run.config.text_update_interval
         self.sequence = 0
-        self.since = None if run.config.text_update_full else 0.0
+        # Output is always fetched incrementally, the full console is
+        # reconstructed from the accumulated chunks when needed
+        self.since = None
+        self.retries = 0
+        # Loop time of the last successful poll, or of the first attempt
+        self.last_success = None
+        self.output = ConsoleBuffer(run.host_output_limit)
+        # Position in the output up to which it was sent
+        self.emitted = 0
+        # Characters of output sent so far, persisted in checkpoints
+        self.emitted_length = 0
+        self.resume_length = None
+        self.done = False
+        # Task state as reported by the job invocation summary, None if unknown
+        self.job_status = None
+        self.polled_status = None
+
+    def snapshot(self):
+        return dict(
+            name=self.name,
+            id=self.id,
+            job_invocation_id=self.job_invocation_id,
+            sequence=self.sequence,
+            since=self.since,
+            emitted_length=self.emitted_length,
+            done=self.done,
+        )
+
+    def restore(self, state):
+        self.id = state["id"]
+        self.job_invocation_id = state["job_invocation_id"]
+        self.sequence = state["sequence"]
+        self.emitted_length = state["emitted_length"]
+        self.done = state["done"]
+        if self.run.config.text_update_full:
+            # The full console has to be fetched again, but the part of it
+            # which was already sent is not sent again
+            self.resume_length = self.emitted_length
+        else:
+            self.since = state["since"]
 
     def mark_as_failed(self, message):
+        self.done = True
         queue = self.run.queue
         playbook_run_id = self.run.playbook_run_id
         queue.playbook_run_update(self.name, playbook_run_id, message, self.sequence)
@@ -96,49 +274,140 @@ class Host:
             self.name, playbook_run_id, ResponseQueue.RESULT_FAILURE
         )
 
-    async def polling_loop(self):
-        last_output = ""
-        if self.id is None:
-            return self.mark_as_failed("This host is not known by Satellite")
-        while True:
-            response = await self.poll_with_retries()
-            if response["error"]:
-                break
-            body = response["body"]
-            if body["output"] and (self.run.config.text_updates or body["complete"]):
-                last_output = "".join(chunk["output"] for chunk in body["output"])
-                if self.since is not None:
-                    self.since = body["output"][-1]["timestamp"]
-                self.run.queue.playbook_run_update(
-                    self.name, self.run.playbook_run_id, last_output, self.sequence
-                )
-                self.sequence += 1
-            if body["complete"]:
-                result = ResponseQueue.RESULT_FAILURE
-                if last_output.endswith("Exit status: 0"):
-                    result = ResponseQueue.RESULT_SUCCESS
-                elif self.run.cancelled:
-                    result = ResponseQueue.RESULT_CANCEL
-                self.run.queue.playbook_run_finished(
-                    self.name, self.run.playbook_run_id, result
-                )
-                break
-
-    async def poll_with_retries(self):
-        retry = 0
-        while retry < 5:
-            await asyncio.sleep(self.run.config.text_update_interval)
-            response = await self.run.satellite_api.output(
-                self.run.job_invocation_id, self.id, self.since
+    def finished(self):
+        return self.job_status not in (
+            None,
+            self.JOB_STATUS_PENDING,
+            self.JOB_STATUS_RUNNING,
+        )
+
+    def needs_output(self):
+        if self.job_status == self.JOB_STATUS_PENDING:
+            return False
+        # A running host only produces something we care about if we relay
+        # text updates, otherwise wait until its state changes
+        if self.run.config.text_updates:
+            return True
+        if self.job_status == self.JOB_STATUS_RUNNING:
+            return self.polled_status != self.job_status
+        return True
+
+    async def poll(self):
+        if not self.needs_output():
+            self.adapt_interval(False)
+            return False
+        self.polled_status = self.job_status
+        response = await self.fetch_output()
+        if response["error"] is None:
+            received = self.output.length
+            done = self.handle_output(response["body"])
+            self.adapt_interval(self.output.length > received)
+            return done
+        if isinstance(response["error"], CircuitOpenError):
+            # Polls held back do not count as retries, but a lasting outage
+            # must not keep the host running forever
+            timeout = self.run.config.outage_timeout
+            if asyncio.get_event_loop().time() - self.last_success < timeout:
+                return False
+            self.mark_as_failed(
+                f"No successful poll for {timeout} seconds: {response['error']}"
+            )
+            return True
+        if self.retries >= self.MAX_RETRIES:
+            metrics.POLL_RETRIES_EXHAUSTED.inc()
+            self.mark_as_failed(response["error"])
+            return True
+        return False
+
+    def console(self):
+        if self.run.config.text_update_full:
+            return self.output.text()
+        return self.output.text_since(self.emitted)
+
+    def handle_output(self, body):
+        if body["output"]:
+            # The buffer keeps pieces, chunks are not joined into another copy
+            for chunk in body["output"]:
+                self.output.append(chunk["output"])
+            self.since = body["output"][-1]["timestamp"]
+            if self.resume_length is not None:
+                if self.output.length <= self.resume_length:
+                    self.emitted = self.output.length
+                self.resume_length = None
+        if self.output.length > self.emitted and (
+            self.run.config.text_updates or body["complete"]
+        ):
+            console = self.console()
+            self.run.queue.playbook_run_update(
+                self.name,
+                self.run.playbook_run_id,
+                console,
+                self.sequence,
+                coalesce=self.run.config.text_update_full,
             )
-            if response["error"] is None:
-                return response
-            retry += 1
-        self.mark_as_failed(response["error"])
-        return dict(error=True)
+            self.emitted_length += self.output.length - self.emitted
+            self.emitted = self.output.length
+            self.sequence += 1
+        if body["complete"]:
+            self.done = True
+            result = ResponseQueue.RESULT_FAILURE
+            if self.output.endswith("Exit status: 0"):
+                result = ResponseQueue.RESULT_SUCCESS
+            elif self.run.cancelled:
+                result = ResponseQueue.RESULT_CANCEL
+            self.run.queue.playbook_run_finished(
+                self.name, self.run.playbook_run_id, result
+            )
+            return True
+        return False
+
+    async def fetch_output(self):
+        if self.last_success is None:
+            self.last_success = asyncio.get_event_loop().time()
+        response = await self.run.satellite_api.output(
+            self.job_invocation_id, self.id, self.since, self.finished()
+        )
+        if response["error"] is None:
+            self.retries = 0
+            self.last_success = asyncio.get_event_loop().time()
+        elif isinstance(response["error"], CircuitOpenError):
+            # Requests held back by the circuit breaker are not failures
+            metrics.POLL_ERRORS.inc(reason="circuit_open")
+        else:
+            timed_out = isinstance(response["error"], RequestTimeoutError)
+            metrics.POLL_ERRORS.inc(reason="timeout" if timed_out else "error")
+            self.retries += 1
+        return response
+
+    def adapt_interval(self, active):
+        config = self.run.config
+        if not config.adaptive_polling:
+            return
+        # Poll hosts producing output more often, back off from idle ones
+        if active:
+            self.interval = max(self.interval / 2, config.adaptive_polling_min_interval)
+        else:
+            self.interval = min(
+                self.interval * 1.5, config.adaptive_polling_max_interval
+            )
+
+    def next_poll_delay(self):
+        interval = self.interval
+        if not self.retries:
+            return interval
+        # Exponential backoff with jitter, so retries of many hosts spread out
+        delay = min(interval * 2 ** (self.retries - 1), self.MAX_BACKOFF)
+        return delay / 2 + random.uniform(0, delay / 2)
 
 
 class Run:
+    # How many job invocations of a run may be triggered at the same time
+    TRIGGER_CONCURRENCY = 4
+    # Characters of console output kept per host and shared by all hosts
+    HOST_OUTPUT_LIMIT = 4 * 1024 * 1024
+    RUN_OUTPUT_LIMIT = 1024 * 1024 * 1024
+    MIN_HOST_OUTPUT_LIMIT = 1024
+
     def __init__(
         self,
         queue,
@@ -156,20 +425,29 @@ class Run:
         self.playbook_run_id = playbook_run_id
         self.account = account
         self.playbook = playbook
-        self.config = Config.from_raw(Config.validate_input(config, logger))
-
-        unsafe_hostnames = [name for name in hosts if "," in name]
-        for name in unsafe_hostnames:
-            logger.warning(f"Hostname '{name}' contains a comma, skipping")
-            Host(self, None, name).mark_as_failed("Hostname contains a comma, skipping")
-
-        self.hosts = [
-            Host(self, None, name) for name in hosts if name not in unsafe_hostnames
-        ]
+        self.raw_config = Config.validate_input(config, logger)
+        self.config = Config.from_raw(self.raw_config)
+        self.host_output_limit = None
+
+        self.hosts = []
+        for name in hosts:
+            if "," in name:
+                logger.warning(f"Hostname '{name}' contains a comma, skipping")
+                Host(self, None, name).mark_as_failed(
+                    "Hostname contains a comma, skipping"
+                )
+            else:
+                self.hosts.append(Host(self, None, name))
+        self.limit_output(self.HOST_OUTPUT_LIMIT, self.RUN_OUTPUT_LIMIT)
         self.satellite_api = satellite_api
         self.logger = logger
-        self.job_invocation_id = None
+        self.job_invocation_ids = []
         self.cancelled = False
+        # Optional CheckpointStore the run's progress is saved to
+        self.checkpoints = None
+        self.__checkpoint_due = None
+        self.deadline = None
+        self.admitted_hosts = 0
 
     @classmethod
     def from_raw(cls, queue, raw, satellite_api, logger):
@@ -185,7 +463,67 @@ class Run:
             logger,
         )
 
+    @classmethod
+    def from_checkpoint(cls, queue, state, satellite_api, logger):
+        run = cls(
+            queue,
+            state["remediation_id"],
+            state["playbook_run_id"],
+            state["account"],
+            [host["name"] for host in state["hosts"]],
+            state["playbook"],
+            state["config"],
+            satellite_api,
+            logger,
+        )
+        for host, host_state in zip(run.hosts, state["hosts"]):
+            host.restore(host_state)
+        run.job_invocation_ids = state["job_invocation_ids"]
+        run.cancelled = state["cancelled"]
+        return run
+
+    def limit_output(self, host_limit, run_limit):
+        limits = [] if host_limit is None else [host_limit]
+        if run_limit is not None:
+            limits.append(run_limit // max(len(self.hosts), 1))
+        self.host_output_limit = None
+        if limits:
+            self.host_output_limit = max(min(limits), self.MIN_HOST_OUTPUT_LIMIT)
+        for host in self.hosts:
+            host.output.limit = self.host_output_limit
+
+    def snapshot(self):
+        return dict(
+            remediation_id=self.remedation_id,
+            playbook_run_id=self.playbook_run_id,
+            account=self.account,
+            playbook=self.playbook,
+            config=self.raw_config,
+            job_invocation_ids=self.job_invocation_ids,
+            cancelled=self.cancelled,
+            hosts=[host.snapshot() for host in self.hosts],
+        )
+
+    async def checkpoint(self, force=False):
+        if self.checkpoints is None:
+            return
+        now = asyncio.get_event_loop().time()
+        if force or self.__checkpoint_due is None or self.__checkpoint_due <= now:
+            self.__checkpoint_due = now + self.checkpoints.interval
+            # The snapshot is taken right away so it is consistent, encoding
+            # and writing it is left to the executor
+            await in_executor(self.checkpoints.save, self.snapshot())
+
     async def start(self):
+        await self.__supervise(self.__trigger_and_poll)
+
+    async def resume(self):
+        self.logger.info(
+            f"Resuming playbook run {self.playbook_run_id} of job invocations {self.job_invocation_ids}"
+        )
+        await self.__supervise(self.poll)
+
+    async def __supervise(self, body):
         await self.satellite_api.init_session()
         try:
             if not await run_monitor.register(self):
@@ -193,35 +531,145 @@ class Run:
                     f"Playbook run {self.playbook_run_id} already known, skipping."
                 )
                 return
-            response = await self.satellite_api.trigger(
-                {"playbook": self.playbook}, [host.name for host in self.hosts]
-            )
-            self.queue.ack(self.playbook_run_id)
-            if response["error"]:
-                self.abort(response["error"])
-            else:
-                self.job_invocation_id = response["body"]["id"]
-                self.logger.info(
-                    f"Playbook run {self.playbook_run_id} running as job invocation {self.job_invocation_id}"
-                )
-                self.update_hosts(response["body"]["targeting"]["hosts"])
-                await asyncio.gather(*[host.polling_loop() for host in self.hosts])
+            metrics.ACTIVE_RUNS.inc()
+            if self.config.run_timeout is not None:
+                loop = asyncio.get_event_loop()
+                self.deadline = loop.time() + self.config.run_timeout
+            try:
+                await body()
+                await self.queue.drain()
+            finally:
+                metrics.ACTIVE_RUNS.dec()
+            if self.checkpoints is not None:
+                await in_executor(self.checkpoints.delete, self.playbook_run_id)
             await run_monitor.done(self)
             self.logger.info(f"Playbook run {self.playbook_run_id} done")
         finally:
             await self.satellite_api.close_session()
 
-    def update_hosts(self, hosts):
-        host_map = {host.name: host for host in self.hosts}
-        for host in hosts:
+    async def __trigger_and_poll(self):
+        size = self.config.trigger_batch_size
+        semaphore = asyncio.Semaphore(self.TRIGGER_CONCURRENCY)
+        await asyncio.gather(
+            *[
+                self.trigger(self.hosts[i : i + size], semaphore)
+                for i in range(0, len(self.hosts), size)
+            ]
+        )
+        self.queue.ack(self.playbook_run_id)
+        if self.job_invocation_ids:
+            await self.checkpoint(force=True)
+            await self.poll()
+
+    async def trigger(self, hosts, semaphore):
+        async with semaphore:
+            response = await self.satellite_api.trigger(
+                {"playbook": self.playbook}, [host.name for host in hosts]
+            )
+        if response["error"]:
+            return self.abort(response["error"], hosts)
+        job_invocation_id = response["body"]["id"]
+        self.job_invocation_ids.append(job_invocation_id)
+        self.logger.info(
+            f"Playbook run {self.playbook_run_id} running {len(hosts)} hosts as job invocation {job_invocation_id}"
+        )
+        self.update_hosts(
+            hosts, job_invocation_id, response["body"]["targeting"]["hosts"]
+        )
+
+    def update_hosts(self, hosts, job_invocation_id, targeted_hosts):
+        host_map = {host.name: host for host in hosts}
+        for host in targeted_hosts:
             host_map[host["name"]].id = host["id"]
+        for host in hosts:
+            host.job_invocation_id = job_invocation_id
+
+    async def poll(self):
+        known = []
+        for host in self.hosts:
+            # Hosts of batches which failed to trigger were already failed
+            if host.done:
+                continue
+            if host.id is None:
+                host.mark_as_failed("This host is not known by Satellite")
+            else:
+                known.append(host)
+        if known:
+            scheduler = PollScheduler(
+                self,
+                known,
+                self.config.text_update_interval,
+                self.config.polling_concurrency,
+            )
+            await self.poll_admitted(scheduler, known)
+
+    async def poll_admitted(self, scheduler, hosts):
+        if not admission.available(len(hosts)):
+            queued_runs = admission.waiting + 1
+            queued_hosts = admission.waiting_hosts + len(hosts)
+            self.logger.info(
+                f"Playbook run {self.playbook_run_id} waiting for polling capacity, {queued_runs} runs with {queued_hosts} hosts queued"
+            )
+        queued_at = asyncio.get_event_loop().time()
+        await admission.acquire(len(hosts))
+        waited = asyncio.get_event_loop().time() - queued_at
+        if waited >= 1:
+            self.logger.info(
+                f"Playbook run {self.playbook_run_id} admitted for polling after {waited:.0f} seconds"
+            )
+        if self.deadline is not None:
+            # Time spent waiting for admission does not count against the deadline
+            self.deadline += waited
+        self.admitted_hosts = len(hosts)
+        try:
+            await self.poll_until_deadline(scheduler, hosts)
+        finally:
+            admission.release(self.admitted_hosts, runs=1)
+            self.admitted_hosts = 0
+
+    async def poll_until_deadline(self, scheduler, hosts):
+        timeout = None
+        if self.deadline is not None:
+            timeout = max(self.deadline - asyncio.get_event_loop().time(), 0)
+        try:
+            await asyncio.wait_for(scheduler.start(), timeout)
+        except asyncio.TimeoutError:
+            self.abort(
+                f"Playbook run exceeded its deadline of {self.config.run_timeout} seconds",
+                [host for host in hosts if not host.done],
+            )
 
-    def abort(self, error):
+    def host_done(self):
+        # Hosts which finished make room for runs waiting to be polled
+        if self.admitted_hosts:
+            self.admitted_hosts -= 1
+            admission.release(1)
+
+    async def refresh_host_statuses(self):
+        responses = await asyncio.gather(
+            *[
+                self.satellite_api.job_invocation(job_invocation_id)
+                for job_invocation_id in self.job_invocation_ids
+            ]
+        )
+        statuses = {}
+        for job_invocation_id, response in zip(self.job_invocation_ids, responses):
+            if response["error"]:
+                self.logger.warning(
+                    f"Could not load status of job invocation {job_invocation_id}: {response['error']}"
+                )
+                continue
+            for host in response["body"]["targeting"]["hosts"]:
+                statuses[host["id"]] = host.get("job_status")
+        for host in self.hosts:
+            host.job_status = statuses.get(host.id)
+
+    def abort(self, error, hosts):
         error = str(error)
         self.logger.error(
-            f"Playbook run {self.playbook_run_id} encountered error `{error}`, aborting."
+            f"Playbook run {self.playbook_run_id} encountered error `{error}`, aborting {len(hosts)} hosts."
         )
-        for host in self.hosts:
+        for host in hosts:
             host.mark_as_failed(error)
 
 
@@ -237,30 +685,112 @@ async def cancel_run(satellite_api, run_id, queue, logger):
         status = ResponseQueue.CANCEL_RESULT_FAILURE
     else:
         await satellite_api.init_session()
-        response = await satellite_api.cancel(run.job_invocation_id)
+        responses = await asyncio.gather(
+            *[
+                satellite_api.cancel(job_invocation_id)
+                for job_invocation_id in run.job_invocation_ids
+            ]
+        )
         run.cancelled = True
+        await run.checkpoint(force=True)
         await satellite_api.close_session()
-        if response["status"] == 422:
-            status = ResponseQueue.CANCEL_RESULT_FINISHED
-        elif response["status"] == 200:
+        statuses = [response["status"] for response in responses]
+        if 200 in statuses:
             status = ResponseQueue.CANCEL_RESULT_CANCELLING
+        elif statuses and all(status == 422 for status in statuses):
+            status = ResponseQueue.CANCEL_RESULT_FINISHED
         else:
             status = ResponseQueue.CANCEL_RESULT_FAILURE
     queue.playbook_run_cancel_ack(run_id, status)
+    await queue.drain()
 
 
 def run(coroutine):
-    loop = asyncio.new_event_loop()
-    return loop.run_until_complete(coroutine)
+    metrics.loop_lag.watch(event_loop.start())
+    return event_loop.run(coroutine)
+
+
+async def start_runs(new_run, interrupted_runs):
+    await asyncio.gather(
+        new_run.start(), *[interrupted.resume() for interrupted in interrupted_runs]
+    )
+
+
+def load_interrupted_runs(store, queue, satellite_api, logger, output_limits):
+    runs = []
+    for state in store.take_interrupted():
+        run = Run.from_checkpoint(queue, state, satellite_api, logger)
+        run.checkpoints = store
+        run.limit_output(*output_limits)
+        runs.append(run)
+    return runs
+
+
+def output_limits(plugin_config):
+    host_limit = plugin_config.get("host_output_limit", Run.HOST_OUTPUT_LIMIT)
+    run_limit = plugin_config.get("run_output_limit", Run.RUN_OUTPUT_LIMIT)
+    return (
+        None if host_limit is None else int(host_limit),
+        None if run_limit is None else int(run_limit),
+    )
+
+
+def configure_admission(plugin_config):
+    # Changing the limits may admit waiting runs, which has to happen in the loop
+    event_loop.call_soon(
+        admission.configure,
+        plugin_config.get("max_concurrent_runs"),
+        plugin_config.get("max_polled_hosts"),
+    )
+
+
+def export_metrics(plugin_config):
+    port = plugin_config.get("metrics_port")
+    path = plugin_config.get("metrics_file")
+    if port or path:
+        run(metrics.exporter.start(port, path))
+
+
+@atexit.register
+def shutdown():
+    async def cleanup():
+        await metrics.exporter.stop()
+        await session_pool.close()
+
+    event_loop.stop(cleanup)
 
 
 @receptor_export
 def execute(message, config, queue):
     logger = configure_logger()
-    queue = ResponseQueue(queue)
-    payload = json.loads(message.raw_payload)
-    satellite_api = SatelliteAPI.from_plugin_config(config["plugin_config"])
-    run(Run.from_raw(queue, payload, config, satellite_api, logger).start())
+    plugin_config = config["plugin_config"]
+    max_pending = plugin_config.get("max_pending_messages")
+    queue = ResponseQueue(queue, None if max_pending is None else int(max_pending))
+    payload = codec.loads(message.raw_payload)
+    satellite_api = SatelliteAPI.from_plugin_config(plugin_config)
+    export_metrics(plugin_config)
+    run_monitor.configure(
+        plugin_config.get("finished_runs_capacity"),
+        plugin_config.get("finished_runs_ttl"),
+    )
+    configure_admission(plugin_config)
+    new_run = Run.from_raw(queue, payload, satellite_api, logger)
+    limits = output_limits(plugin_config)
+    new_run.limit_output(*limits)
+    interrupted_runs = []
+    store = checkpoint_stores.get(
+        plugin_config.get("checkpoint_file"), plugin_config.get("checkpoint_interval")
+    )
+    if store is not None:
+        new_run.checkpoints = store
+        # The messages which started runs interrupted by a restart are gone,
+        # their progress is reported through the first message received after
+        # it. Receptor closes the response once execute returns, so it has to
+        # wait for the resumed runs as well.
+        interrupted_runs = load_interrupted_runs(
+            store, queue, satellite_api, logger, limits
+        )
+    run(start_runs(new_run, interrupted_runs))
 
 
 @receptor_export
@@ -268,7 +798,8 @@ def cancel(message, config, queue):
     logger = configure_logger()
     queue = ResponseQueue(queue)
     satellite_api = SatelliteAPI.from_plugin_config(config)
-    payload = json.loads(message.raw_payload)
+    export_metrics(config)
+    payload = codec.loads(message.raw_payload)
     run(cancel_run(satellite_api, payload.get("playbook_run_id"), queue, logger))
 
 
@@ -276,8 +807,8 @@ def cancel(message, config, queue):
 def health_check(message, config, queue):
     logger = configure_logger()
     try:
-        payload = json.loads(message.raw_payload)
-    except json.JSONDecodeError:
+        payload = codec.loads(message.raw_payload)
+    except ValueError:
         logger.exception("Invalid JSON format for payload.")
         raise
 
@@ -288,5 +819,6 @@ def health_check(message, config, queue):
             result=HEALTH_CHECK_ERROR, **HEALTH_STATUS_RESULTS[HEALTH_CHECK_ERROR]
         )
     else:
+        export_metrics(config)
         result = run(api.health_check(payload.get("satellite_instance_id", "")))
     queue.put(result)
@@ -14,12 +14,15 @@ setup(
     author="Red Hat Ansible",
     url="https://github.com/adamruzicka/receptor-satellite",
     license="Apache",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks"]),
     long_description=long_description,
     long_description_content_type="text/markdown",
     install_requires=["aiohttp"],
     zip_safe=False,
     entry_points={"receptor.worker": "receptor_satellite = receptor_satellite.worker"},
     classifiers=["Programming Language :: Python :: 3"],
-    extras_require={"dev": ["pytest", "flake8", "pylint", "black"]},
+    extras_require={
+        "dev": ["pytest", "flake8", "pylint", "black"],
+        "fast-json": ["orjson"],
+    },
 )
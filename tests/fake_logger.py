@@ -1,8 +1,12 @@
 class FakeLogger:
     def __init__(self):
+        self.infos = []
         self.warnings = []
         self.errors = []
 
+    def info(self, message):
+        self.infos.append(message)
+
     def warning(self, message):
         self.warnings.append(message)
 
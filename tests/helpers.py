@@ -0,0 +1,17 @@
+import asyncio
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+async def run_pending():
+    # asyncio.sleep is stubbed out by some test modules
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+    loop.call_soon(future.set_result, None)
+    await future
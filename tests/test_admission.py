@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+
+from receptor_satellite import metrics
+from receptor_satellite.admission import AdmissionControl
+from helpers import run_pending
+
+
+@pytest.mark.asyncio
+async def test_runs_over_the_limit_wait():
+    control = AdmissionControl(max_runs=1)
+    await control.acquire(10)
+    waiting = asyncio.ensure_future(control.acquire(10))
+    await run_pending()
+    assert not waiting.done()
+    assert (control.waiting, control.waiting_hosts) == (1, 10)
+    assert metrics.QUEUED_RUNS.get() == 1
+
+    control.release(10, runs=1)
+    await run_pending()
+    assert waiting.done()
+    assert (control.runs, control.hosts, control.waiting) == (1, 10, 0)
+    assert metrics.QUEUED_RUNS.get() == 0
+
+
+@pytest.mark.asyncio
+async def test_hosts_are_released_one_by_one():
+    control = AdmissionControl(max_hosts=10)
+    await control.acquire(8)
+    waiting = asyncio.ensure_future(control.acquire(5))
+    await run_pending()
+    assert not waiting.done()
+
+    for _ in range(3):
+        control.release(1)
+    await run_pending()
+    assert waiting.done()
+    assert control.hosts == 10
+
+
+@pytest.mark.asyncio
+async def test_oversized_run_is_admitted_alone():
+    control = AdmissionControl(max_hosts=10)
+    await control.acquire(5)
+    oversized = asyncio.ensure_future(control.acquire(50))
+    # Runs arriving later do not overtake it
+    small = asyncio.ensure_future(control.acquire(1))
+    await run_pending()
+    assert not oversized.done() and not small.done()
+
+    control.release(5, runs=1)
+    await run_pending()
+    assert oversized.done() and not small.done()
+    control.release(50, runs=1)
+    await run_pending()
+    assert small.done()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    control = AdmissionControl(max_runs=1)
+    await control.acquire(1)
+    cancelled = asyncio.ensure_future(control.acquire(1))
+    waiting = asyncio.ensure_future(control.acquire(1))
+    await run_pending()
+    cancelled.cancel()
+    await run_pending()
+    assert control.waiting == 1
+
+    control.release(1, runs=1)
+    await run_pending()
+    assert waiting.done()
+    assert (control.runs, control.hosts) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_raising_limits_admits_waiting_runs():
+    control = AdmissionControl(max_runs=1, max_hosts=10)
+    await control.acquire(5)
+    first = asyncio.ensure_future(control.acquire(5))
+    second = asyncio.ensure_future(control.acquire(5))
+    await run_pending()
+    assert control.waiting == 2
+
+    control.configure(max_runs=2, max_hosts=10)
+    await run_pending()
+    assert first.done() and not second.done()
+
+    control.configure()
+    await run_pending()
+    assert second.done()
+    assert (control.runs, control.hosts, control.waiting) == (3, 15, 0)
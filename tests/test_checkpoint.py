@@ -0,0 +1,34 @@
+from receptor_satellite.checkpoint import CheckpointStore, CheckpointStores
+
+
+def test_save_load_delete(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    store.save({"playbook_run_id": "play1", "hosts": []})
+    store.save({"playbook_run_id": "play2", "hosts": []})
+    store.save({"playbook_run_id": "play1", "hosts": [{"name": "host1"}]})
+
+    reopened = CheckpointStore(store.path)
+    assert sorted(reopened.load(), key=lambda state: state["playbook_run_id"]) == [
+        {"playbook_run_id": "play1", "hosts": [{"name": "host1"}]},
+        {"playbook_run_id": "play2", "hosts": []},
+    ]
+
+    reopened.delete("play1")
+    assert store.load() == [{"playbook_run_id": "play2", "hosts": []}]
+
+
+def test_interrupted_runs_are_taken_once(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    store.save({"playbook_run_id": "play1"})
+    assert store.take_interrupted() == [{"playbook_run_id": "play1"}]
+    assert store.take_interrupted() == []
+
+
+def test_stores_are_shared_per_path(tmp_path):
+    stores = CheckpointStores()
+    path = str(tmp_path / "checkpoints.db")
+    assert stores.get(None) is None
+    store = stores.get(path)
+    assert store.interval == CheckpointStore.DEFAULT_INTERVAL
+    assert stores.get(path, "5") is store
+    assert store.interval == 5
@@ -0,0 +1,40 @@
+import importlib.util
+import pytest
+
+from receptor_satellite import codec
+
+BODY = {
+    "complete": False,
+    "output": [{"output": "ünïcödé\n", "output_type": "stdout", "timestamp": 1.25}],
+}
+
+
+@pytest.fixture
+def restore_codec():
+    name = codec.name
+    yield
+    codec.select(name)
+
+
+def test_fastest_codec_is_preferred():
+    expected = "json"
+    for name in ["ujson", "orjson"]:
+        if importlib.util.find_spec(name):
+            expected = name
+    assert codec.name == expected
+
+
+@pytest.mark.parametrize("name", list(codec.CODECS))
+def test_codecs_round_trip(name, restore_codec):
+    if name != "json" and not importlib.util.find_spec(name):
+        pytest.skip(f"{name} is not installed")
+    assert codec.select(name) == name
+    assert codec.loads(codec.dumps(BODY)) == BODY
+    assert codec.loads(codec.dumps(BODY).encode()) == BODY
+    with pytest.raises(ValueError):
+        codec.loads("{")
+
+
+def test_unavailable_codec(restore_codec):
+    with pytest.raises(ImportError):
+        codec.select("nonexistent")
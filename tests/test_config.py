@@ -10,20 +10,52 @@ ERROR_HANDLING_TEST_CASES = [
             "text_updates": Config.Defaults.TEXT_UPDATES,
             "text_update_interval": Config.Defaults.TEXT_UPDATE_INTERVAL,
             "text_update_full": Config.Defaults.TEXT_UPDATE_FULL,
+            "polling_concurrency": Config.Defaults.POLLING_CONCURRENCY,
+            "trigger_batch_size": Config.Defaults.TRIGGER_BATCH_SIZE,
+            "adaptive_polling": Config.Defaults.ADAPTIVE_POLLING,
+            "adaptive_polling_min_interval": Config.Defaults.ADAPTIVE_POLLING_MIN_INTERVAL,
+            "adaptive_polling_max_interval": Config.Defaults.ADAPTIVE_POLLING_MAX_INTERVAL,
+            "run_timeout": Config.Defaults.RUN_TIMEOUT,
+            "outage_timeout": Config.Defaults.OUTAGE_TIMEOUT,
         },
         [],
     ),
     (
-        {"text_updates": 27, "text_update_interval": -13, "text_update_full": []},
+        {
+            "text_updates": 27,
+            "text_update_interval": -13,
+            "text_update_full": [],
+            "polling_concurrency": 0,
+            "trigger_batch_size": "10",
+            "adaptive_polling": "yes",
+            "adaptive_polling_min_interval": 10,
+            "adaptive_polling_max_interval": 500,
+            "run_timeout": -1,
+            "outage_timeout": 0,
+        },
         {
             "text_updates": Config.Defaults.TEXT_UPDATES,
             "text_update_interval": Config.Defaults.TEXT_UPDATE_INTERVAL,
             "text_update_full": Config.Defaults.TEXT_UPDATE_FULL,
+            "polling_concurrency": Config.Defaults.POLLING_CONCURRENCY,
+            "trigger_batch_size": Config.Defaults.TRIGGER_BATCH_SIZE,
+            "adaptive_polling": Config.Defaults.ADAPTIVE_POLLING,
+            "adaptive_polling_min_interval": Config.Defaults.ADAPTIVE_POLLING_MIN_INTERVAL,
+            "adaptive_polling_max_interval": Config.Defaults.ADAPTIVE_POLLING_MAX_INTERVAL,
+            "run_timeout": Config.Defaults.RUN_TIMEOUT,
+            "outage_timeout": Config.Defaults.OUTAGE_TIMEOUT,
         },
         [
             "Expected the value of text_updates '27' to be a boolean",
             "Expected the value of text_update_full '[]' to be a boolean",
             "Expected the value of text_update_interval '-13' to be an integer greater or equal than 5000",
+            "Expected the value of polling_concurrency '0' to be a positive integer",
+            "Expected the value of trigger_batch_size '10' to be a positive integer",
+            "Expected the value of adaptive_polling 'yes' to be a boolean",
+            "Expected the value of adaptive_polling_min_interval '10' to be an integer greater or equal than 1000",
+            "Expected the value of adaptive_polling_max_interval '500' to be an integer greater or equal than adaptive_polling_min_interval",
+            "Expected the value of run_timeout '-1' to be a positive integer",
+            "Expected the value of outage_timeout '0' to be a positive integer",
         ],
     ),
     (
@@ -31,11 +63,25 @@ ERROR_HANDLING_TEST_CASES = [
             "text_updates": True,
             "text_update_interval": 10000,
             "text_update_full": False,
+            "polling_concurrency": 4,
+            "trigger_batch_size": 500,
+            "adaptive_polling": True,
+            "adaptive_polling_min_interval": 2000,
+            "adaptive_polling_max_interval": 30000,
+            "run_timeout": 3600,
+            "outage_timeout": 300,
         },
         {
             "text_updates": True,
             "text_update_interval": 10000,
             "text_update_full": False,
+            "polling_concurrency": 4,
+            "trigger_batch_size": 500,
+            "adaptive_polling": True,
+            "adaptive_polling_min_interval": 2000,
+            "adaptive_polling_max_interval": 30000,
+            "run_timeout": 3600,
+            "outage_timeout": 300,
         },
         [],
     ),
@@ -0,0 +1,49 @@
+import pytest
+
+from receptor_satellite.console_buffer import ConsoleBuffer
+
+
+def fill(buffer, pieces):
+    for piece in pieces:
+        buffer.append(piece)
+    return buffer
+
+
+def test_unlimited_buffer_keeps_everything():
+    buffer = fill(ConsoleBuffer(), ["line1\n", "line2\n", "", "line3\n"])
+    assert buffer.text() == "line1\nline2\nline3\n"
+    assert buffer.text_since(6) == "line2\nline3\n"
+    assert buffer.text_since(buffer.length) == ""
+    assert buffer.truncated == 0
+
+
+def test_limited_buffer_keeps_head_and_tail():
+    buffer = fill(ConsoleBuffer(20), ["0123456789", "abcdefghij", "ABCDEFGHIJ"])
+    assert buffer.length == 30
+    assert buffer.truncated == 10
+    assert (
+        buffer.text() == "0123456789" + ConsoleBuffer.MARKER.format(10) + "ABCDEFGHIJ"
+    )
+
+
+@pytest.mark.parametrize(
+    "position,expected",
+    [
+        (5, "56789" + ConsoleBuffer.MARKER.format(10) + "ABCDEFGHIJ"),
+        (12, ConsoleBuffer.MARKER.format(8) + "ABCDEFGHIJ"),
+        (20, "ABCDEFGHIJ"),
+        (25, "FGHIJ"),
+    ],
+)
+def test_text_since_position(position, expected):
+    buffer = fill(ConsoleBuffer(20), ["0123456789", "abcdefghij", "ABCDEFGHIJ"])
+    assert buffer.text_since(position) == expected
+
+
+def test_output_of_any_size_is_capped():
+    buffer = fill(ConsoleBuffer(100), ["x" * 7] * 1000 + ["Exit status: ", "0"])
+    assert len(buffer.text()) == 100 + len(
+        ConsoleBuffer.MARKER.format(buffer.truncated)
+    )
+    assert buffer.endswith("Exit status: 0")
+    assert not buffer.endswith("Exit status: 1")
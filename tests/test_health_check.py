@@ -1,8 +1,10 @@
 import asyncio
 import logging
 import pytest
+from unittest.mock import patch
 
 from receptor_satellite.satellite_api import (
+    HealthCheckCache,
     SatelliteAPI,
     HEALTH_STATUS_RESULTS,
     HEALTH_OK,
@@ -15,6 +17,7 @@ from receptor_satellite.satellite_api import (
     HEALTH_SP_OFFLINE,
 )
 from constants import *  # noqa: F403
+from helpers import FakeClock
 
 
 logger = logging.getLogger(__name__)
@@ -92,15 +95,19 @@ TEST_CASES = [
 
 class FakeSatelliteAPI(SatelliteAPI):
     def __init__(self, *args, **kwargs):
+        # Every scenario has to reach the fake Satellite
+        kwargs.setdefault("health_check_ttl", 0)
         super().__init__(*args, **kwargs)
         self.response_map = {}
+        self.requests = []
 
-    async def request(self, method, url, extra_data):
+    async def request(self, method, url, extra_data, reader=None):
+        self.requests.append(url)
         to_return = self.response_map.get(
             url, dict(error="Not found", body="{}", status=404)
         )
         logger.debug(f"Request for {url} -> {to_return}")
-        return to_return
+        return dict(to_return)
 
 
 @pytest.fixture(scope="module", params=TEST_CASES)
@@ -119,3 +126,61 @@ def test_health_check(scenario):
     assert response["code"] == status_code
     assert response["fifi_status"] == status_result["fifi_status"]
     assert response["result"] == status_result["result"]
+    assert set(response["timings"]) == {"instance_id", "smart_proxies"}
+
+
+def test_health_check_stages_run_concurrently():
+    class SlowSatelliteAPI(FakeSatelliteAPI):
+        async def request(self, method, url, extra_data, reader=None):
+            self.requests.append(url)
+            # Only returns once both stages have sent their request
+            while len(self.requests) < 2:
+                try:
+                    await asyncio.wait_for(asyncio.Event().wait(), 0.001)
+                except asyncio.TimeoutError:
+                    pass
+            return dict(self.response_map[url])
+
+    api = SlowSatelliteAPI(**PLUGIN_CONFIG)
+    api.response_map = {
+        UUID_URL: dict(error=None, status=200, body=UUID_RESPONSE_BODY),
+        STATUSES_URL: dict(error=None, status=200, body=STATUSES_RESPONSE_BODY),
+    }
+    loop = asyncio.new_event_loop()
+    try:
+        response = loop.run_until_complete(asyncio.wait_for(api.health_check(UUID), 1))
+    finally:
+        loop.close()
+    assert response["code"] == HEALTH_OK
+
+
+def test_health_check_results_are_shared():
+    clock = FakeClock()
+    api = FakeSatelliteAPI(health_check_ttl=30, **PLUGIN_CONFIG)
+    api.response_map = {
+        UUID_URL: dict(error=None, status=200, body=UUID_RESPONSE_BODY),
+        STATUSES_URL: dict(error=None, status=200, body=STATUSES_RESPONSE_BODY),
+    }
+    loop = asyncio.new_event_loop()
+
+    async def checks(count):
+        return await asyncio.gather(*[api.health_check(UUID) for _ in range(count)])
+
+    try:
+        with patch(
+            "receptor_satellite.satellite_api.health_checks", HealthCheckCache(clock)
+        ):
+            # Concurrent checks share a single probe
+            responses = loop.run_until_complete(checks(3))
+            assert [response["code"] for response in responses] == [HEALTH_OK] * 3
+            assert api.requests == [UUID_URL, STATUSES_URL]
+
+            clock.now = 29
+            loop.run_until_complete(checks(1))
+            assert len(api.requests) == 2
+
+            clock.now = 31
+            loop.run_until_complete(checks(1))
+            assert len(api.requests) == 4
+    finally:
+        loop.close()
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+import time
+
+from receptor_satellite import metrics
+from receptor_satellite.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    LoopLagMonitor,
+    Registry,
+)
+from receptor_satellite.satellite_api import SatelliteAPI
+from constants import PLUGIN_CONFIG
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    counter = registry.register(Counter("requests_total", "Requests", ["endpoint"]))
+    gauge = registry.register(Gauge("active", "Active things"))
+    histogram = registry.register(
+        Histogram("duration_seconds", "Duration", ["endpoint"], buckets=[0.1, 1])
+    )
+    counter.inc(endpoint="output")
+    counter.inc(2, endpoint='say "hi"')
+    gauge.inc(3)
+    gauge.dec()
+    histogram.observe(0.05, endpoint="output")
+    histogram.observe(0.5, endpoint="output")
+    histogram.observe(5, endpoint="output")
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{endpoint="output"} 1',
+        'requests_total{endpoint="say \\"hi\\""} 2',
+        "# HELP active Active things",
+        "# TYPE active gauge",
+        "active 2",
+        "# HELP duration_seconds Duration",
+        "# TYPE duration_seconds histogram",
+        'duration_seconds_bucket{endpoint="output",le="0.1"} 1',
+        'duration_seconds_bucket{endpoint="output",le="1"} 2',
+        'duration_seconds_bucket{endpoint="output",le="+Inf"} 3',
+        'duration_seconds_sum{endpoint="output"} 5.55',
+        'duration_seconds_count{endpoint="output"} 3',
+    ]
+
+
+def test_dump_to_file(tmp_path):
+    registry = Registry()
+    registry.register(Counter("requests_total", "Requests")).inc()
+    path = tmp_path / "metrics.prom"
+    metrics.MetricsExporter(registry).dump(str(path))
+    assert "requests_total 1" in path.read_text().splitlines()
+
+
+@pytest.mark.asyncio
+async def test_satellite_requests_are_measured():
+    class FakeSatelliteAPI(SatelliteAPI):
+        async def request(self, method, url, extra_data, reader=None):
+            return dict(error=None, status=500, body='{"error": {"message": "boom"}}')
+
+    api = FakeSatelliteAPI(**dict(PLUGIN_CONFIG, url="http://metrics.example.com"))
+    count = metrics.REQUEST_DURATION.count(endpoint="cancel")
+    errors = metrics.REQUEST_ERRORS.get(endpoint="cancel")
+    await api.cancel(1)
+    assert metrics.REQUEST_DURATION.count(endpoint="cancel") == count + 1
+    assert metrics.REQUEST_ERRORS.get(endpoint="cancel") == errors + 1
+
+
+def test_loop_lag_is_measured():
+    histogram = Histogram("lag_seconds", "Lag")
+    monitor = LoopLagMonitor(histogram, interval=0.01)
+    loop = asyncio.new_event_loop()
+    monitor.watch(loop)
+    monitor.watch(loop)
+
+    async def block():
+        time.sleep(0.05)
+        try:
+            await asyncio.wait_for(asyncio.Event().wait(), 0.05)
+        except asyncio.TimeoutError:
+            pass
+
+    loop.run_until_complete(block())
+    loop.close()
+    assert histogram.count() >= 1
+    counts, total = histogram.values[()]
+    assert total >= 0.03
@@ -0,0 +1,65 @@
+import json
+import pytest
+
+from receptor_satellite.output_stream import OutputStreamParser
+
+BODIES = [
+    {"complete": False, "output": []},
+    {
+        "complete": True,
+        "output": [
+            {"output_type": "stdout", "output": "line1\n", "timestamp": 1.5},
+            {"output_type": "stdout", "output": 'ünïcödé [{,}]"', "timestamp": 2},
+        ],
+        "refresh": None,
+        "delay": 10,
+    },
+    {"output": None, "complete": True},
+    {"refresh": 1500.25, "delay": -1.5e-10, "complete": False, "output": [], "n": 0},
+]
+
+
+def parse(pieces):
+    parser = OutputStreamParser()
+    for piece in pieces:
+        parser.feed(piece)
+    return parser.close()
+
+
+@pytest.mark.parametrize("body", BODIES)
+def test_parse_split_anywhere(body):
+    for indent in [None, 2]:
+        text = json.dumps(body, indent=indent, ensure_ascii=False)
+        for split in range(len(text) + 1):
+            assert parse([text[:split], text[split:]]) == body
+
+
+@pytest.mark.parametrize("body", BODIES)
+def test_parse_split_in_three_anywhere(body):
+    text = json.dumps(body)
+    for first in range(len(text) + 1):
+        for second in range(first, len(text) + 1):
+            pieces = [text[:first], text[first:second], text[second:]]
+            assert parse(pieces) == body
+
+
+def test_parse_many_small_pieces():
+    body = {
+        "complete": True,
+        "output": [{"output": "x" * 1000, "timestamp": i} for i in range(100)],
+    }
+    text = json.dumps(body)
+    assert parse(text[i : i + 7] for i in range(0, len(text), 7)) == body
+
+
+@pytest.mark.parametrize(
+    "text", ['{"complete": true, "output": [{"output": "x"}', '{"complete": tr', ""]
+)
+def test_truncated_body(text):
+    with pytest.raises(ValueError):
+        parse([text])
+
+
+def test_unexpected_data():
+    with pytest.raises(ValueError):
+        parse(['{"complete": true} []'])
@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+
+from receptor_satellite.poll_scheduler import PollScheduler
+from receptor_satellite.response_queue import ResponseQueue
+from fake_logger import FakeLogger
+
+
+class FakeRun:
+    def __init__(self):
+        self.playbook_run_id = "play_id"
+        self.logger = FakeLogger()
+        self.queue = ResponseQueue(None)
+        self.refreshes = 0
+
+    async def refresh_host_statuses(self):
+        self.refreshes += 1
+
+    async def checkpoint(self):
+        pass
+
+    def host_done(self):
+        pass
+
+
+class FakeHost:
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, name, polls_needed, error=None):
+        self.name = name
+        self.polls_needed = polls_needed
+        self.error = error
+        self.polls = 0
+        self.failures = []
+
+    async def poll(self):
+        FakeHost.in_flight += 1
+        FakeHost.max_in_flight = max(FakeHost.max_in_flight, FakeHost.in_flight)
+        try:
+            self.polls += 1
+            if self.error:
+                raise self.error
+            return self.polls >= self.polls_needed
+        finally:
+            FakeHost.in_flight -= 1
+
+    def next_poll_delay(self):
+        return 0.001
+
+    def mark_as_failed(self, message):
+        self.failures.append(message)
+
+
+@pytest.mark.asyncio
+async def test_polls_until_done():
+    FakeHost.max_in_flight = 0
+    hosts = [FakeHost(f"host{i}", i + 1) for i in range(5)]
+    run = FakeRun()
+    scheduler = PollScheduler(run, hosts, 0.001, 2)
+    await scheduler.start()
+    assert [host.polls for host in hosts] == [1, 2, 3, 4, 5]
+    assert scheduler.active == 0
+    assert run.refreshes >= 1
+    assert FakeHost.max_in_flight <= 2
+
+
+@pytest.mark.asyncio
+async def test_failing_host_does_not_stall_run():
+    run = FakeRun()
+    broken = FakeHost("broken", 1, error=RuntimeError("boom"))
+    fine = FakeHost("fine", 2)
+    await PollScheduler(run, [broken, fine], 0.001, 1).start()
+    assert broken.failures == ["boom"]
+    assert fine.polls == 2
+    assert run.logger.errors == [
+        "Polling host broken in playbook run play_id failed: boom"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_poll_does_not_fail_host():
+    class HangingHost(FakeHost):
+        async def poll(self):
+            self.polls += 1
+            await asyncio.get_event_loop().create_future()
+
+    host = HangingHost("hanging", 1)
+    task = asyncio.ensure_future(PollScheduler(FakeRun(), [host], 0.001, 1).start())
+    while not host.polls:
+        await asyncio.wait([task], timeout=0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert host.failures == []
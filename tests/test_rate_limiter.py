@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+
+from receptor_satellite.rate_limiter import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    RateLimiter,
+    RateLimiters,
+)
+from helpers import run_pending
+
+
+@pytest.mark.asyncio
+async def test_limits_requests_in_flight_by_priority():
+    limiter = RateLimiter(max_in_flight=1)
+    order = []
+
+    async def request(name, priority):
+        async with limiter.slot(priority):
+            order.append(name)
+            await run_pending()
+
+    await limiter.acquire()
+    tasks = [
+        asyncio.ensure_future(request("poll", PRIORITY_LOW)),
+        asyncio.ensure_future(request("trigger", PRIORITY_NORMAL)),
+        asyncio.ensure_future(request("cancel", PRIORITY_HIGH)),
+    ]
+    await run_pending()
+    assert (limiter.in_flight, limiter.waiting) == (1, 3)
+    limiter.release()
+    await asyncio.gather(*tasks)
+    assert order == ["cancel", "trigger", "poll"]
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_limits_request_rate():
+    now = [0.0]
+    limiter = RateLimiter(rate=100, clock=lambda: now[0])
+    for _x in range(100):
+        await limiter.acquire()
+        limiter.release()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await run_pending()
+    assert not waiter.done()
+    now[0] = 0.01
+    await asyncio.wait_for(waiter, 1)
+    assert limiter.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_slot():
+    limiter = RateLimiter(max_in_flight=1)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await run_pending()
+    waiter.cancel()
+    await run_pending()
+    limiter.release()
+    assert limiter.in_flight == 0
+    await limiter.acquire()
+    assert limiter.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_raising_limits_admits_waiting_requests():
+    limiter = RateLimiter(max_in_flight=1)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await run_pending()
+    assert not waiter.done()
+    limiter.configure(None, 2)
+    await run_pending()
+    assert waiter.done()
+    assert limiter.in_flight == 2
+
+
+def test_limiters_are_shared_per_url():
+    limiters = RateLimiters()
+    limiter = limiters.get("https://satellite.example.com", None, 10)
+    assert limiters.get("https://satellite.example.com", 5, 20) is limiter
+    # Limiters in use are not reconfigured outside of the event loop
+    assert (limiter.rate, limiter.max_in_flight) == (None, 10)
+    assert limiters.get("https://other.example.com", None, 10) is not limiter
@@ -0,0 +1,77 @@
+import queue
+import pytest
+
+from receptor_satellite import metrics
+from receptor_satellite.response_queue import ResponseQueue
+
+
+def drain(q):
+    messages = []
+    while not q.empty():
+        messages.append(q.get_nowait())
+    return messages
+
+
+def test_passthrough_without_max_pending():
+    q = queue.Queue()
+    response_queue = ResponseQueue(q)
+    response_queue.ack("play_id")
+    response_queue.playbook_run_update("host1", "play_id", "a", 0, coalesce=True)
+    response_queue.playbook_run_update("host1", "play_id", "ab", 1, coalesce=True)
+    assert [m["type"] for m in drain(q)] == [
+        "playbook_run_ack",
+        "playbook_run_update",
+        "playbook_run_update",
+    ]
+    assert response_queue.dropped == 0
+
+
+def test_console_characters_are_counted():
+    response_queue = ResponseQueue(queue.Queue())
+    sent = metrics.CONSOLE_CHARACTERS.get()
+    response_queue.playbook_run_update("host1", "play_id", "čeština", 0)
+    assert metrics.CONSOLE_CHARACTERS.get() == sent + 7
+
+
+def test_coalesces_pending_updates():
+    # Receptor's queue is unbounded
+    q = queue.Queue()
+    response_queue = ResponseQueue(q, max_pending=1)
+    response_queue.ack("play_id")
+    response_queue.playbook_run_update("host1", "play_id", "a", 0, coalesce=True)
+    response_queue.playbook_run_update("host2", "play_id", "x", 0, coalesce=True)
+    response_queue.playbook_run_update("host1", "play_id", "ab", 1, coalesce=True)
+    response_queue.playbook_run_finished("host1", "play_id")
+    # Not coalescable, must not be replaced by anything after it
+    response_queue.playbook_run_update("host2", "play_id", "failed", 1)
+    response_queue.playbook_run_update("host2", "play_id", "failed!", 2, coalesce=True)
+    assert response_queue.depth == 5
+    assert response_queue.dropped == 1
+
+    messages = []
+    while response_queue.depth:
+        messages.extend(drain(q))
+        response_queue.flush()
+    messages.extend(drain(q))
+
+    assert [(m["type"], m.get("host"), m.get("sequence")) for m in messages] == [
+        ("playbook_run_ack", None, None),
+        ("playbook_run_update", "host1", 1),
+        ("playbook_run_update", "host2", 0),
+        ("playbook_run_finished", "host1", None),
+        ("playbook_run_update", "host2", 1),
+        ("playbook_run_update", "host2", 2),
+    ]
+    assert messages[1]["console"] == "ab"
+
+
+@pytest.mark.asyncio
+async def test_wait_for_capacity():
+    q = queue.Queue()
+    response_queue = ResponseQueue(q, max_pending=1)
+    response_queue.ack("play_id")
+    response_queue.ack("play_id")
+    assert response_queue.full()
+    q.get_nowait()
+    await response_queue.wait_for_capacity()
+    assert not response_queue.full()
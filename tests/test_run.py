@@ -1,5 +1,6 @@
 import asyncio
 import pytest
+import threading
 
 
 async def _sleep_override(interval):
@@ -8,9 +9,16 @@ async def _sleep_override(interval):
 
 asyncio.sleep = _sleep_override
 
-from receptor_satellite.worker import Host, Run  # noqa: E402
+from receptor_satellite.worker import Config, Host, Run, cancel_run  # noqa: E402
+from receptor_satellite.checkpoint import CheckpointStore  # noqa: E402
+from receptor_satellite.admission import admission  # noqa: E402
+from receptor_satellite.circuit_breaker import CircuitOpenError  # noqa: E402
 from receptor_satellite.response_queue import ResponseQueue  # noqa: E402
+from receptor_satellite.run_monitor import run_monitor  # noqa: E402
+from receptor_satellite.satellite_api import SatelliteAPI  # noqa: E402
+from constants import PLUGIN_CONFIG  # noqa: E402
 from fake_logger import FakeLogger  # noqa: E402
+from helpers import run_pending  # noqa: E402
 
 
 class FakeQueue:
@@ -31,7 +39,34 @@ class FakeSatelliteAPI:
     def real_output(self, job_id, host_id, since):
         return {"error": None}
 
-    async def output(self, job_id, host_id, since):
+    def real_job_invocation(self, job_id):
+        return {"error": None, "body": {"targeting": {"hosts": []}}}
+
+    async def init_session(self):
+        pass
+
+    async def close_session(self):
+        pass
+
+    def real_trigger(self, inputs, hosts):
+        return {"error": "controlled failure"}
+
+    async def trigger(self, inputs, hosts):
+        self.record_request("trigger", hosts)
+        return self.real_trigger(inputs, hosts)
+
+    def real_cancel(self, job_id):
+        return {"error": None, "status": 200}
+
+    async def cancel(self, job_id):
+        self.record_request("cancel", job_id)
+        return self.real_cancel(job_id)
+
+    async def job_invocation(self, job_id):
+        self.record_request("job_invocation", job_id)
+        return self.real_job_invocation(job_id)
+
+    async def output(self, job_id, host_id, since, final=False):
         self.record_request("output", (job_id, host_id, since))
         return self.real_output(job_id, host_id, since)
 
@@ -77,106 +112,39 @@ def test_mark_as_failed(base_scenario):
     ]
 
 
-class PollWithRetriesTestCase:
-    def __init__(
-        self,
-        host_id=1,
-        api_output=None,
-        result=None,
-        api_requests=[],
-        queue_messages=[],
-    ):
-        self.host_id = host_id
-        self.api_output = api_output
-        self.result = result
-        self.api_requests = api_requests
-        self.queue_messages = queue_messages
-
-
-POLL_WITH_RETRIES_TEST_CASES = [
-    # Polling loop does not loop if there is no error when talking to
-    # the API
-    PollWithRetriesTestCase(
-        result={"error": None, "key": "value"},
-        api_output={"error": None, "key": "value"},
-        api_requests=[("output", (None, 1, None))],
-    ),
-    PollWithRetriesTestCase(
-        result={"error": True},
-        api_output={"error": "controlled failure"},
-        api_requests=[("output", (None, 1, None)) for _x in range(5)],
-        queue_messages=[
-            {
-                "type": "playbook_run_update",
-                "playbook_run_id": "play_id",
-                "sequence": 0,
-                "host": "host1",
-                "console": "controlled failure",
-            },
-            {
-                "type": "playbook_run_finished",
-                "playbook_run_id": "play_id",
-                "host": "host1",
-                "status": ResponseQueue.RESULT_FAILURE,
-            },
-        ],
-    ),
-]
-
-
-@pytest.fixture(params=POLL_WITH_RETRIES_TEST_CASES)
-def poll_with_retries_scenario(request, base_scenario):
-    # host_id, output_value, result, api_requests, queue_messages = request.param
-    param = request.param
-    queue, logger, satellite_api, run = base_scenario
-    host = Host(run, param.host_id, "host1")
-
-    yield (queue, host, param)
-
-
 @pytest.mark.asyncio
-async def test_poll_with_retries(poll_with_retries_scenario):
-    (queue, host, param,) = poll_with_retries_scenario
-    satellite_api = host.run.satellite_api
-    satellite_api.real_output = lambda j, h, s: param.api_output
+@pytest.mark.parametrize(
+    "api_output,retries",
+    [({"error": None, "key": "value"}, 0), ({"error": "controlled failure"}, 3)],
+)
+async def test_fetch_output(api_output, retries, base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    satellite_api.real_output = lambda j, h, s: api_output
+    host = Host(run, 1, "host1")
+    host.retries = 2
 
-    result = await host.poll_with_retries()
+    result = await host.fetch_output()
 
-    assert result == param.result
-    assert satellite_api.requests == param.api_requests
-    assert queue.messages == param.queue_messages
+    assert result == api_output
+    assert host.retries == retries
+    assert satellite_api.requests == [("output", (None, 1, None))]
+    assert queue.messages == []
 
 
-class PollingLoopTestCase(PollWithRetriesTestCase):
-    def __init__(self, cancelled=False, **kwargs):
-        super().__init__(**kwargs)
+class PollTestCase:
+    def __init__(
+        self, api_output=None, api_requests=[], queue_messages=[], cancelled=False
+    ):
+        self.api_output = api_output
+        self.api_requests = api_requests
+        self.queue_messages = queue_messages
         self.cancelled = cancelled
 
 
-POLLING_LOOP_TEST_CASES = [
-    # If the host doesn't have an ID, it is assumed to be not known by
-    # Satellite and is marked as failed
-    PollingLoopTestCase(
-        host_id=None,
-        queue_messages=[
-            {
-                "type": "playbook_run_update",
-                "playbook_run_id": "play_id",
-                "sequence": 0,
-                "host": "host1",
-                "console": "This host is not known by Satellite",
-            },
-            {
-                "type": "playbook_run_finished",
-                "playbook_run_id": "play_id",
-                "host": "host1",
-                "status": ResponseQueue.RESULT_FAILURE,
-            },
-        ],
-    ),
-    # If the polling loop receives an error from the API, it marks the
-    # host as failed
-    PollingLoopTestCase(
+POLL_TEST_CASES = [
+    # If polling keeps receiving errors from the API, it marks the host
+    # as failed once it runs out of retries
+    PollTestCase(
         api_output={"error": "controlled failure"},
         api_requests=[("output", (None, 1, None)) for _x in range(5)],
         queue_messages=[
@@ -197,10 +165,13 @@ POLLING_LOOP_TEST_CASES = [
     ),
     # If the last output from the API ends with Exit status: 0, mark
     # the run on the host as success
-    PollingLoopTestCase(
+    PollTestCase(
         api_output={
             "error": None,
-            "body": {"complete": True, "output": [{"output": "Exit status: 0"}]},
+            "body": {
+                "complete": True,
+                "output": [{"output": "Exit status: 0", "timestamp": 1.0}],
+            },
         },
         api_requests=[("output", (None, 1, None))],
         queue_messages=[
@@ -221,11 +192,14 @@ POLLING_LOOP_TEST_CASES = [
     ),
     # If the run was cancelled, but the host managed to finish
     # successfully, mark it as success
-    PollingLoopTestCase(
+    PollTestCase(
         cancelled=True,
         api_output={
             "error": None,
-            "body": {"complete": True, "output": [{"output": "Exit status: 0"}]},
+            "body": {
+                "complete": True,
+                "output": [{"output": "Exit status: 0", "timestamp": 1.0}],
+            },
         },
         api_requests=[("output", (None, 1, None))],
         queue_messages=[
@@ -245,10 +219,13 @@ POLLING_LOOP_TEST_CASES = [
         ],
     ),
     # If the host failed, mark it as failed
-    PollingLoopTestCase(
+    PollTestCase(
         api_output={
             "error": None,
-            "body": {"complete": True, "output": [{"output": "Exit status: 123"}]},
+            "body": {
+                "complete": True,
+                "output": [{"output": "Exit status: 123", "timestamp": 1.0}],
+            },
         },
         api_requests=[("output", (None, 1, None))],
         queue_messages=[
@@ -269,11 +246,14 @@ POLLING_LOOP_TEST_CASES = [
     ),
     # If the run was cancelled and the run on the host failed, mark it
     # as cancelled
-    PollingLoopTestCase(
+    PollTestCase(
         cancelled=True,
         api_output={
             "error": None,
-            "body": {"complete": True, "output": [{"output": "Exit status: 123"}]},
+            "body": {
+                "complete": True,
+                "output": [{"output": "Exit status: 123", "timestamp": 1.0}],
+            },
         },
         api_requests=[("output", (None, 1, None))],
         queue_messages=[
@@ -295,26 +275,716 @@ POLLING_LOOP_TEST_CASES = [
 ]
 
 
-@pytest.fixture(params=POLLING_LOOP_TEST_CASES)
-def polling_loop_scenario(request, base_scenario):
+@pytest.fixture(params=POLL_TEST_CASES)
+def poll_scenario(request, base_scenario):
     queue, logger, satellite_api, run = base_scenario
     run.cancelled = request.param.cancelled
-    host = Host(run, request.param.host_id, "host1")
+    host = Host(run, 1, "host1")
 
     yield (queue, host, request.param)
 
 
 @pytest.mark.asyncio
-async def test_polling_loop(polling_loop_scenario):
-    (queue, host, param,) = polling_loop_scenario
+async def test_poll(poll_scenario):
+    (queue, host, param,) = poll_scenario
     satellite_api = host.run.satellite_api
     satellite_api.real_output = lambda j, h, s: param.api_output
-    result = await host.polling_loop()
-    assert result == param.result
+    done = False
+    while not done:
+        done = await host.poll()
     assert satellite_api.requests == param.api_requests
     assert queue.messages == param.queue_messages
 
 
+@pytest.mark.asyncio
+async def test_poll_fails_hosts_unknown_to_satellite(base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    await run.poll()
+    assert satellite_api.requests == []
+    assert queue.messages == [
+        {
+            "type": "playbook_run_update",
+            "playbook_run_id": "play_id",
+            "sequence": 0,
+            "host": "host1",
+            "console": "This host is not known by Satellite",
+        },
+        {
+            "type": "playbook_run_finished",
+            "playbook_run_id": "play_id",
+            "host": "host1",
+            "status": ResponseQueue.RESULT_FAILURE,
+        },
+    ]
+
+
+@pytest.mark.asyncio
+async def test_poll_gives_up_after_max_retries(base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    satellite_api.real_output = lambda j, h, s: {"error": "controlled failure"}
+    host = Host(run, 1, "host1")
+
+    results = [await host.poll() for _x in range(Host.MAX_RETRIES)]
+
+    assert results == [False] * (Host.MAX_RETRIES - 1) + [True]
+    assert len(satellite_api.requests) == Host.MAX_RETRIES
+    assert [message["type"] for message in queue.messages] == [
+        "playbook_run_update",
+        "playbook_run_finished",
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "text_update_full,consoles",
+    [
+        (True, ["line1\n", "line1\nExit status: 0"]),
+        (False, ["line1\n", "Exit status: 0"]),
+    ],
+)
+async def test_incremental_output(text_update_full, consoles, base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    run.config.text_updates = True
+    run.config.text_update_full = text_update_full
+    responses = iter(
+        [
+            {"complete": False, "output": [{"output": "line1\n", "timestamp": 1.0}]},
+            {
+                "complete": True,
+                "output": [{"output": "Exit status: 0", "timestamp": 2.0}],
+            },
+        ]
+    )
+    satellite_api.real_output = lambda j, h, s: {"error": None, "body": next(responses)}
+    host = Host(run, 1, "host1")
+
+    assert await host.poll() is False
+    assert await host.poll() is True
+
+    assert satellite_api.requests == [
+        ("output", (None, 1, None)),
+        ("output", (None, 1, 1.0)),
+    ]
+    updates = [m for m in queue.messages if m["type"] == "playbook_run_update"]
+    assert [m["console"] for m in updates] == consoles
+    assert [m["sequence"] for m in updates] == [0, 1]
+    assert queue.messages[-1]["status"] == ResponseQueue.RESULT_SUCCESS
+
+
+@pytest.mark.asyncio
+async def test_output_is_capped(base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    run.limit_output(2048, None)
+    responses = iter(
+        [
+            {"complete": False, "output": [{"output": "x" * 5000, "timestamp": 1.0}]},
+            {
+                "complete": True,
+                "output": [{"output": "\nExit status: 0", "timestamp": 2.0}],
+            },
+        ]
+    )
+    satellite_api.real_output = lambda j, h, s: {"error": None, "body": next(responses)}
+    host = run.hosts[0]
+    host.id = 1
+
+    assert await host.poll() is False
+    assert await host.poll() is True
+
+    update, finished = queue.messages
+    assert len(update["console"]) < 2048 + 100
+    assert "characters of output truncated" in update["console"]
+    assert update["console"].endswith("Exit status: 0")
+    assert finished["status"] == ResponseQueue.RESULT_SUCCESS
+
+
+def test_output_chunks_are_appended_one_by_one(base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    run.limit_output(2048, None)
+    host = run.hosts[0]
+    chunks = [{"output": f"{i:04}" * 100, "timestamp": i} for i in range(10)]
+
+    assert host.handle_output({"complete": True, "output": chunks}) is True
+
+    console = queue.messages[0]["console"]
+    assert console.startswith("0000" * 100 + "0001")
+    assert console.endswith("0009" * 100)
+    assert "1952 characters of output truncated" in console
+    assert host.since == 9
+
+
+def test_run_output_limit_is_shared_by_hosts(base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    run.hosts.append(Host(run, None, "host2"))
+    run.limit_output(None, 10000)
+    assert [host.output.limit for host in run.hosts] == [5000, 5000]
+    run.limit_output(4000, 10000)
+    assert run.host_output_limit == 4000
+    run.limit_output(4000, 100)
+    assert run.host_output_limit == Run.MIN_HOST_OUTPUT_LIMIT
+    run.limit_output(None, None)
+    assert run.host_output_limit is None
+
+
+@pytest.mark.asyncio
+async def test_poll_does_not_count_open_circuit_as_failure(base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    error = CircuitOpenError("http://localhost")
+    satellite_api.real_output = lambda j, h, s: {"error": error}
+    host = Host(run, 1, "host1")
+
+    for _x in range(Host.MAX_RETRIES * 2):
+        assert await host.poll() is False
+
+    assert host.retries == 0
+    assert host.next_poll_delay() == run.config.text_update_interval
+    assert queue.messages == []
+
+
+@pytest.mark.asyncio
+async def test_poll_fails_host_after_lasting_outage(base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    error = CircuitOpenError("http://localhost")
+    satellite_api.real_output = lambda j, h, s: {"error": error}
+    host = Host(run, 1, "host1")
+
+    assert await host.poll() is False
+    host.last_success -= run.config.outage_timeout
+    assert await host.poll() is True
+
+    assert queue.messages[0]["console"] == (
+        f"No successful poll for {Config.Defaults.OUTAGE_TIMEOUT} seconds: {error}"
+    )
+    assert queue.messages[1]["status"] == ResponseQueue.RESULT_FAILURE
+
+
+def test_next_poll_delay_backs_off(base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    host = Host(run, 1, "host1")
+    interval = run.config.text_update_interval
+    for retries, delay in [(1, interval), (3, interval * 4), (10, Host.MAX_BACKOFF)]:
+        host.retries = retries
+        assert delay / 2 <= host.next_poll_delay() <= delay
+
+
+@pytest.mark.asyncio
+async def test_unchanged_output_is_not_emitted(base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    run.config.text_updates = True
+    responses = iter(
+        [
+            {"complete": False, "output": [{"output": "line1\n", "timestamp": 1.0}]},
+            {"complete": False, "output": [{"output": "", "timestamp": 2.0}]},
+            {"complete": False, "output": []},
+            {"complete": True, "output": [{"output": "", "timestamp": 3.0}]},
+        ]
+    )
+    satellite_api.real_output = lambda j, h, s: {"error": None, "body": next(responses)}
+    host = Host(run, 1, "host1")
+
+    while not await host.poll():
+        pass
+
+    assert [(m["type"], m.get("sequence")) for m in queue.messages] == [
+        ("playbook_run_update", 0),
+        ("playbook_run_finished", None),
+    ]
+    assert host.since == 3.0
+
+
+@pytest.mark.asyncio
+async def test_adaptive_polling_interval(base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    run.config.adaptive_polling = True
+    run.config.adaptive_polling_min_interval = 1
+    run.config.adaptive_polling_max_interval = 8
+    bodies = [
+        {"complete": False, "output": [{"output": "line", "timestamp": 1.0}]},
+        {"complete": False, "output": [{"output": "line", "timestamp": 2.0}]},
+        {"complete": False, "output": [{"output": "line", "timestamp": 3.0}]},
+        {"complete": False, "output": []},
+        {"complete": False, "output": []},
+        {"complete": False, "output": []},
+        {"complete": False, "output": []},
+        {"complete": False, "output": []},
+        {"complete": False, "output": []},
+    ]
+    responses = iter(bodies)
+    satellite_api.real_output = lambda j, h, s: {"error": None, "body": next(responses)}
+    host = Host(run, 1, "host1")
+    host.interval = 4
+
+    intervals = []
+    for _body in bodies:
+        await host.poll()
+        intervals.append(host.interval)
+
+    assert intervals == [2, 1, 1, 1.5, 2.25, 3.375, 5.0625, 7.59375, 8]
+    assert host.next_poll_delay() == 8
+
+
+JOB_INVOCATION_HOST_STATUSES = [
+    {"id": 1, "name": "host1", "job_status": "pending"},
+    {"id": 2, "name": "host2", "job_status": "running"},
+    {"id": 3, "name": "host3", "job_status": "success"},
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("text_updates,third_round", [(False, [3]), (True, [2, 3])])
+async def test_poll_skips_unchanged_hosts(text_updates, third_round, base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    run.config.text_updates = text_updates
+    run.hosts = [
+        Host(run, host["id"], host["name"]) for host in JOB_INVOCATION_HOST_STATUSES
+    ]
+    run.job_invocation_ids = [42]
+    satellite_api.real_job_invocation = lambda j: {
+        "error": None,
+        "body": {"targeting": {"hosts": JOB_INVOCATION_HOST_STATUSES}},
+    }
+    satellite_api.real_output = lambda j, h, s: {
+        "error": None,
+        "body": {"complete": False, "output": []},
+    }
+
+    # Before the first summary is known every host gets polled
+    for host in run.hosts:
+        await host.poll()
+    await run.refresh_host_statuses()
+    for host in run.hosts:
+        await host.poll()
+    await run.refresh_host_statuses()
+    for host in run.hosts:
+        await host.poll()
+
+    output_requests = [
+        data[1] for (kind, data) in satellite_api.requests if kind == "output"
+    ]
+    assert output_requests == [1, 2, 3] + [2, 3] + third_round
+
+
+@pytest.mark.asyncio
+async def test_refresh_host_statuses_failure(base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    run.hosts[0].job_status = "pending"
+    run.job_invocation_ids = [42]
+    satellite_api.real_job_invocation = lambda j: {"error": "controlled failure"}
+    await run.refresh_host_statuses()
+    assert run.hosts[0].job_status is None
+    assert logger.warnings == [
+        "Could not load status of job invocation 42: controlled failure"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_start_triggers_batches():
+    queue = FakeQueue()
+    satellite_api = FakeSatelliteAPI()
+    run = Run(
+        ResponseQueue(queue),
+        "rem_id",
+        "batched_play_id",
+        "account_no",
+        ["host1", "host2", "host3", "host4", "host5"],
+        "playbook",
+        {"trigger_batch_size": 2},
+        satellite_api,
+        FakeLogger(),
+    )
+    run.config.text_update_interval = 0.001
+    job_invocation_ids = iter([10, 20])
+
+    def trigger(inputs, hosts):
+        if "host5" in hosts:
+            return {"error": "controlled failure"}
+        return {
+            "error": None,
+            "body": {
+                "id": next(job_invocation_ids),
+                "targeting": {
+                    "hosts": [{"id": int(name[-1]), "name": name} for name in hosts]
+                },
+            },
+        }
+
+    satellite_api.real_trigger = trigger
+    satellite_api.real_output = lambda j, h, s: {
+        "error": None,
+        "body": {
+            "complete": True,
+            "output": [{"output": "Exit status: 0", "timestamp": 1.0}],
+        },
+    }
+
+    await run.start()
+
+    assert [data for (kind, data) in satellite_api.requests if kind == "trigger"] == [
+        ["host1", "host2"],
+        ["host3", "host4"],
+        ["host5"],
+    ]
+    assert sorted(
+        data[:2] for (kind, data) in satellite_api.requests if kind == "output"
+    ) == [(10, 1), (10, 2), (20, 3), (20, 4)]
+    # Every host finishes exactly once
+    finished = sorted(
+        (m["host"], m["status"])
+        for m in queue.messages
+        if m["type"] == "playbook_run_finished"
+    )
+    assert finished == [
+        ("host1", ResponseQueue.RESULT_SUCCESS),
+        ("host2", ResponseQueue.RESULT_SUCCESS),
+        ("host3", ResponseQueue.RESULT_SUCCESS),
+        ("host4", ResponseQueue.RESULT_SUCCESS),
+        ("host5", ResponseQueue.RESULT_FAILURE),
+    ]
+    assert sorted(run.job_invocation_ids) == [10, 20]
+
+
+@pytest.mark.asyncio
+async def test_run_waits_for_polling_capacity():
+    queue = FakeQueue()
+    satellite_api = FakeSatelliteAPI()
+    logger = FakeLogger()
+    run = Run(
+        ResponseQueue(queue),
+        "rem_id",
+        "queued_play_id",
+        "account_no",
+        ["host1"],
+        "playbook",
+        {},
+        satellite_api,
+        logger,
+    )
+    run.config.text_update_interval = 0.001
+    satellite_api.real_trigger = lambda inputs, hosts: {
+        "error": None,
+        "body": {"id": 10, "targeting": {"hosts": [{"id": 1, "name": "host1"}]}},
+    }
+    satellite_api.real_output = lambda j, h, s: {
+        "error": None,
+        "body": {
+            "complete": True,
+            "output": [{"output": "Exit status: 0", "timestamp": 1.0}],
+        },
+    }
+    admission.configure(max_runs=1)
+    await admission.acquire(5)
+    try:
+        task = asyncio.ensure_future(run.start())
+        while not admission.waiting and not task.done():
+            await run_pending()
+        assert [m["type"] for m in queue.messages] == ["playbook_run_ack"]
+        assert logger.infos[-1] == (
+            "Playbook run queued_play_id waiting for polling capacity, 1 runs with 1 hosts queued"
+        )
+        admission.release(5, runs=1)
+        await task
+    finally:
+        admission.configure()
+    assert queue.messages[-1]["status"] == ResponseQueue.RESULT_SUCCESS
+    assert (admission.runs, admission.hosts) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_run_deadline_fails_remaining_hosts():
+    queue = FakeQueue()
+    satellite_api = FakeSatelliteAPI()
+    logger = FakeLogger()
+    run = Run(
+        ResponseQueue(queue),
+        "rem_id",
+        "deadline_play_id",
+        "account_no",
+        ["host1", "host2"],
+        "playbook",
+        {"run_timeout": 1},
+        satellite_api,
+        logger,
+    )
+    run.config.run_timeout = 0.05
+    run.config.text_update_interval = 0.001
+    satellite_api.real_trigger = lambda inputs, hosts: {
+        "error": None,
+        "body": {
+            "id": 10,
+            "targeting": {
+                "hosts": [{"id": 1, "name": "host1"}, {"id": 2, "name": "host2"}]
+            },
+        },
+    }
+
+    def output(job_id, host_id, since):
+        complete = host_id == 1
+        chunk = "Exit status: 0" if complete else "still running\n"
+        return {
+            "error": None,
+            "body": {
+                "complete": complete,
+                "output": [{"output": chunk, "timestamp": 1.0}],
+            },
+        }
+
+    satellite_api.real_output = output
+
+    await run.start()
+
+    finished = {
+        m["host"]: m["status"]
+        for m in queue.messages
+        if m["type"] == "playbook_run_finished"
+    }
+    assert finished == {
+        "host1": ResponseQueue.RESULT_SUCCESS,
+        "host2": ResponseQueue.RESULT_FAILURE,
+    }
+    assert queue.messages[-2]["console"] == (
+        "Playbook run exceeded its deadline of 0.05 seconds"
+    )
+    assert logger.errors == [
+        "Playbook run deadline_play_id encountered error `Playbook run exceeded its deadline of 0.05 seconds`, aborting 1 hosts."
+    ]
+
+
+@pytest.mark.asyncio
+async def test_run_deadline_cancels_requests_in_flight():
+    class HangingResponse:
+        async def __aenter__(self):
+            await asyncio.get_event_loop().create_future()
+
+        async def __aexit__(self, *_exc):
+            pass
+
+    class HangingSession:
+        def request(self, method, url, **extra_data):
+            return HangingResponse()
+
+    class HangingSatelliteAPI(SatelliteAPI):
+        async def init_session(self):
+            self.session = HangingSession()
+
+        async def trigger(self, inputs, hosts):
+            return {
+                "error": None,
+                "body": {
+                    "id": 10,
+                    "targeting": {"hosts": [{"id": 1, "name": "host1"}]},
+                },
+            }
+
+        async def job_invocation(self, job_invocation_id):
+            return {"error": None, "body": {"targeting": {"hosts": []}}}
+
+    satellite_api = HangingSatelliteAPI(
+        **dict(PLUGIN_CONFIG, url="http://hanging.example.com")
+    )
+    queue = FakeQueue()
+    run = Run(
+        ResponseQueue(queue),
+        "rem_id",
+        "hanging_play_id",
+        "account_no",
+        ["host1"],
+        "playbook",
+        {"run_timeout": 1},
+        satellite_api,
+        FakeLogger(),
+    )
+    run.config.run_timeout = 0.05
+    run.config.text_update_interval = 0.001
+
+    await run.start()
+
+    # The cancelled poll is neither retried nor a failure of Satellite
+    assert run.hosts[0].retries == 0
+    assert satellite_api.breaker.failures == 0
+    assert [m["type"] for m in queue.messages] == [
+        "playbook_run_ack",
+        "playbook_run_update",
+        "playbook_run_finished",
+    ]
+    assert queue.messages[1]["console"] == (
+        "Playbook run exceeded its deadline of 0.05 seconds"
+    )
+
+
+@pytest.mark.asyncio
+async def test_run_deadline_excludes_time_waiting_for_admission():
+    queue = FakeQueue()
+    satellite_api = FakeSatelliteAPI()
+    run = Run(
+        ResponseQueue(queue),
+        "rem_id",
+        "queued_deadline_play_id",
+        "account_no",
+        ["host1"],
+        "playbook",
+        {"run_timeout": 1},
+        satellite_api,
+        FakeLogger(),
+    )
+    run.config.run_timeout = 0.05
+    run.config.text_update_interval = 0.001
+    satellite_api.real_trigger = lambda inputs, hosts: {
+        "error": None,
+        "body": {"id": 10, "targeting": {"hosts": [{"id": 1, "name": "host1"}]}},
+    }
+    satellite_api.real_output = lambda j, h, s: {
+        "error": None,
+        "body": {
+            "complete": True,
+            "output": [{"output": "Exit status: 0", "timestamp": 1.0}],
+        },
+    }
+    admission.configure(max_runs=1)
+    await admission.acquire(5)
+    try:
+        task = asyncio.ensure_future(run.start())
+        while not admission.waiting and not task.done():
+            await run_pending()
+        # Queued for longer than the run may take
+        loop = asyncio.get_event_loop()
+        waited = loop.create_future()
+        loop.call_later(0.1, waited.set_result, None)
+        await waited
+        admission.release(5, runs=1)
+        await task
+    finally:
+        admission.configure()
+    assert queue.messages[-1]["status"] == ResponseQueue.RESULT_SUCCESS
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "statuses,result",
+    [
+        ([200, 422], ResponseQueue.CANCEL_RESULT_CANCELLING),
+        ([422, 422], ResponseQueue.CANCEL_RESULT_FINISHED),
+        ([500, 422], ResponseQueue.CANCEL_RESULT_FAILURE),
+    ],
+)
+async def test_cancel_run_cancels_all_job_invocations(statuses, result, base_scenario):
+    queue, logger, satellite_api, run = base_scenario
+    run.playbook_run_id = f"cancel_{result}_{statuses[0]}"
+    run.job_invocation_ids = [10, 20]
+    responses = dict(zip(run.job_invocation_ids, statuses))
+    satellite_api.real_cancel = lambda j: {"error": None, "status": responses[j]}
+    await run_monitor.register(run)
+
+    await cancel_run(satellite_api, run.playbook_run_id, run.queue, logger)
+
+    assert [data for (kind, data) in satellite_api.requests] == [10, 20]
+    assert run.cancelled
+    assert queue.messages[-1] == {
+        "type": "playbook_run_cancel_ack",
+        "playbook_run_id": run.playbook_run_id,
+        "status": result,
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "text_update_full,console",
+    [(True, "line1\nline2\nExit status: 0"), (False, "line2\nExit status: 0")],
+)
+async def test_resume_from_checkpoint(text_update_full, console, tmp_path):
+    satellite_api = FakeSatelliteAPI()
+    run = Run(
+        ResponseQueue(FakeQueue()),
+        "rem_id",
+        f"resumed_play_id_{text_update_full}",
+        "account_no",
+        ["host1", "host2"],
+        "playbook",
+        {"text_updates": True, "text_update_full": text_update_full},
+        satellite_api,
+        FakeLogger(),
+    )
+    run.checkpoints = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    run.update_hosts(run.hosts, 10, [{"id": 1, "name": "host1"}])
+    run.job_invocation_ids = [10]
+    run.hosts[0].handle_output(
+        {"complete": False, "output": [{"output": "line1\n", "timestamp": 1.0}]}
+    )
+    run.hosts[1].mark_as_failed("controlled failure")
+    await run.checkpoint()
+
+    chunks = [
+        {"output": "line1\n", "timestamp": 1.0},
+        {"output": "line2\n", "timestamp": 2.0},
+        {"output": "Exit status: 0", "timestamp": 3.0},
+    ]
+    satellite_api.real_output = lambda j, h, s: {
+        "error": None,
+        "body": {
+            "complete": True,
+            "output": [
+                chunk for chunk in chunks if s is None or chunk["timestamp"] > s
+            ],
+        },
+    }
+    queue = FakeQueue()
+    (state,) = run.checkpoints.take_interrupted()
+    resumed = Run.from_checkpoint(
+        ResponseQueue(queue), state, satellite_api, FakeLogger()
+    )
+    resumed.checkpoints = run.checkpoints
+    resumed.config.text_update_interval = 0.001
+
+    await resumed.resume()
+
+    assert [kind for (kind, data) in satellite_api.requests if kind == "trigger"] == []
+    assert queue.messages == [
+        {
+            "type": "playbook_run_update",
+            "playbook_run_id": resumed.playbook_run_id,
+            "sequence": 1,
+            "host": "host1",
+            "console": console,
+        },
+        {
+            "type": "playbook_run_finished",
+            "playbook_run_id": resumed.playbook_run_id,
+            "host": "host1",
+            "status": ResponseQueue.RESULT_SUCCESS,
+        },
+    ]
+    assert run.checkpoints.load() == []
+
+
+@pytest.mark.asyncio
+async def test_checkpoints_are_written_off_the_event_loop(tmp_path):
+    threads = []
+
+    class RecordingStore(CheckpointStore):
+        def save(self, state):
+            threads.append(threading.current_thread())
+            super().save(state)
+
+    run = Run(
+        ResponseQueue(FakeQueue()),
+        "rem_id",
+        "checkpointed_play_id",
+        "account_no",
+        ["host1"],
+        "playbook",
+        {},
+        FakeSatelliteAPI(),
+        FakeLogger(),
+    )
+    run.checkpoints = RecordingStore(str(tmp_path / "checkpoints.db"))
+    await run.checkpoint()
+    # Not due yet
+    await run.checkpoint()
+
+    assert len(threads) == 1
+    assert threads[0] is not threading.current_thread()
+    assert run.checkpoints.load() == [run.snapshot()]
+
+
 def test_hostname_sanity():
     hosts = ["good", "fine", "not,really,good", "ok"]
     logger = FakeLogger()
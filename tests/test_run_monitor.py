@@ -0,0 +1,53 @@
+import pytest
+
+from receptor_satellite.run_monitor import RunMonitor
+from helpers import FakeClock
+
+
+class FakeRun:
+    def __init__(self, playbook_run_id):
+        self.playbook_run_id = playbook_run_id
+
+
+@pytest.mark.asyncio
+async def test_finished_runs_become_tombstones():
+    monitor = RunMonitor(clock=FakeClock())
+    run = FakeRun("play_id")
+    assert await monitor.register(run)
+    assert not await monitor.register(run)
+    assert await monitor.get("play_id") is run
+    assert (monitor.live, monitor.tombstoned) == (1, 0)
+
+    await monitor.done(run)
+    assert await monitor.get("play_id") is True
+    assert not await monitor.register(run)
+    assert (monitor.live, monitor.tombstoned) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_tombstones_expire():
+    clock = FakeClock()
+    monitor = RunMonitor(ttl=60, clock=clock)
+    run = FakeRun("play_id")
+    await monitor.register(run)
+    await monitor.done(run)
+    clock.now = 59
+    assert await monitor.get("play_id") is True
+    clock.now = 61
+    assert await monitor.get("play_id") is None
+    assert monitor.tombstoned == 0
+
+
+@pytest.mark.asyncio
+async def test_tombstones_are_bounded():
+    clock = FakeClock()
+    monitor = RunMonitor(capacity=2, clock=clock)
+    runs = [FakeRun(f"play_{i}") for i in range(3)]
+    for run in runs:
+        clock.now += 1
+        await monitor.register(run)
+        await monitor.done(run)
+    assert monitor.tombstoned == 2
+    assert await monitor.get("play_0") is None
+    assert await monitor.get("play_1") is True
+    assert await monitor.get("play_2") is True
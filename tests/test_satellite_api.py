@@ -0,0 +1,220 @@
+import aiohttp
+import asyncio
+import json
+import os
+import pytest
+import shutil
+import ssl
+from aiohttp import web
+from unittest.mock import patch
+
+from receptor_satellite import metrics
+from receptor_satellite.satellite_api import (
+    RequestTimeoutError,
+    SatelliteAPI,
+    SessionPool,
+)
+from constants import PLUGIN_CONFIG
+
+
+def test_connector_options_from_plugin_config():
+    api = SatelliteAPI.from_plugin_config(
+        dict(PLUGIN_CONFIG, connection_limit="10", dns_cache_ttl=30)
+    )
+    assert api.connector_options == dict(
+        SatelliteAPI.DEFAULT_CONNECTOR_OPTIONS, limit=10, ttl_dns_cache=30
+    )
+
+
+def test_rate_limits_from_plugin_config():
+    config = dict(
+        PLUGIN_CONFIG,
+        url="http://limited.example.com",
+        requests_per_second="2.5",
+        max_requests_in_flight="4",
+    )
+    limiter = SatelliteAPI.from_plugin_config(config).limiter
+    assert (limiter.rate, limiter.max_in_flight) == (2.5, 4)
+    assert SatelliteAPI.from_plugin_config(config).limiter is limiter
+
+
+@pytest.mark.asyncio
+async def test_rate_limits_are_applied_when_session_starts():
+    config = dict(PLUGIN_CONFIG, url="http://reconfigured.example.com")
+    limiter = SatelliteAPI.from_plugin_config(config).limiter
+    api = SatelliteAPI.from_plugin_config(dict(config, max_requests_in_flight="8"))
+    assert limiter.max_in_flight == SatelliteAPI.DEFAULT_MAX_REQUESTS_IN_FLIGHT
+    pool = SessionPool()
+    with patch("receptor_satellite.satellite_api.session_pool", pool):
+        await api.init_session()
+        await api.close_session()
+    await pool.close()
+    assert limiter.max_in_flight == 8
+
+
+def test_timeouts_from_plugin_config():
+    api = SatelliteAPI.from_plugin_config(
+        dict(PLUGIN_CONFIG, read_timeout="30", output_read_timeout=5)
+    )
+    assert api.timeouts["output"].sock_read == 5
+    assert api.timeouts["trigger"].sock_read == 30
+    assert (
+        api.timeouts["trigger"].sock_connect == SatelliteAPI.DEFAULT_TIMEOUTS["connect"]
+    )
+
+
+@pytest.mark.asyncio
+async def test_timeouts_are_reported_separately():
+    class HangingSession:
+        def request(self, method, url, **extra_data):
+            assert extra_data["timeout"].sock_read == 60
+            raise asyncio.TimeoutError()
+
+    api = SatelliteAPI(**dict(PLUGIN_CONFIG, url="http://timeout.example.com"))
+    api.session = HangingSession()
+    timeouts = metrics.REQUEST_TIMEOUTS.get(endpoint="job_invocation")
+    response = await api.job_invocation(1)
+    assert isinstance(response["error"], RequestTimeoutError)
+    assert response["status"] == -1
+    assert metrics.REQUEST_TIMEOUTS.get(endpoint="job_invocation") == timeouts + 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("streamed", [True, False])
+@pytest.mark.parametrize("decode_threshold", [100, 1024 * 1024])
+async def test_output_is_read(streamed, decode_threshold):
+    chunks = [{"output": f"line{i}\n", "timestamp": i} for i in range(100)]
+    text = json.dumps({"complete": True, "output": chunks})
+
+    async def output(request):
+        if not streamed:
+            return web.Response(text=text, content_type="application/json")
+        # Chunked responses have no length, they are always streamed
+        response = web.StreamResponse()
+        response.content_type = "application/json"
+        await response.prepare(request)
+        for i in range(0, len(text), 100):
+            await response.write(text[i : i + 100].encode())
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/api/v2/job_invocations/{id}/hosts/{host_id}", output)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    host, port = runner.addresses[0][:2]
+    api = SatelliteAPI(
+        **dict(PLUGIN_CONFIG, url=f"http://{host}:{port}"),
+        executor_decode_threshold=decode_threshold,
+    )
+    api.session = aiohttp.ClientSession()
+    offloaded = metrics.DECODED_IN_EXECUTOR.get(endpoint="output")
+    try:
+        response = await api.output(1, 2, None)
+    finally:
+        await api.session.close()
+        await runner.cleanup()
+    assert response["error"] is None
+    assert response["body"] == {"complete": True, "output": chunks}
+    assert metrics.DECODED_IN_EXECUTOR.get(endpoint="output") == offloaded + (
+        decode_threshold < len(text)
+    )
+
+
+@pytest.mark.asyncio
+async def test_large_bodies_are_decoded_in_executor():
+    body = {"targeting": {"hosts": [{"id": i, "name": f"host{i}"} for i in range(100)]}}
+
+    class FakeSatelliteAPI(SatelliteAPI):
+        async def request(self, method, url, extra_data, reader=None):
+            return dict(error=None, status=200, body=json.dumps(body))
+
+    api = FakeSatelliteAPI(**PLUGIN_CONFIG, executor_decode_threshold=100)
+    offloaded = metrics.DECODED_IN_EXECUTOR.get(endpoint="job_invocation")
+    response = await api.job_invocation(1)
+    assert response["body"] == body
+    assert metrics.DECODED_IN_EXECUTOR.get(endpoint="job_invocation") == offloaded + 1
+
+
+@pytest.mark.asyncio
+async def test_session_is_kept_until_last_user_closes_it():
+    async def output(request):
+        return web.json_response({"complete": True, "output": []})
+
+    app = web.Application()
+    app.router.add_get("/api/v2/job_invocations/{id}/hosts/{host_id}", output)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    host, port = runner.addresses[0][:2]
+    api = SatelliteAPI(**dict(PLUGIN_CONFIG, url=f"http://{host}:{port}"))
+    pool = SessionPool()
+    try:
+        with patch("receptor_satellite.satellite_api.session_pool", pool):
+            await api.init_session()
+            await api.init_session()
+            await api.close_session()
+            response = await api.output(1, 2, None)
+            await api.close_session()
+    finally:
+        await pool.close()
+        await runner.cleanup()
+    assert response["error"] is None
+    assert response["body"] == {"complete": True, "output": []}
+    assert api.session is None
+
+
+@pytest.mark.asyncio
+async def test_session_pool_reuses_sessions():
+    pool = SessionPool()
+    options = SatelliteAPI.DEFAULT_CONNECTOR_OPTIONS
+    session = pool.get("https://satellite.example.com", options)
+    assert pool.get("https://satellite.example.com", options) is session
+    assert pool.get("https://other.example.com", options) is not session
+    await pool.close()
+    assert session.closed
+    assert pool.get("https://satellite.example.com", options) is not session
+    await pool.close()
+
+
+def test_session_pool_replaces_sessions_from_other_loops():
+    pool = SessionPool()
+    options = SatelliteAPI.DEFAULT_CONNECTOR_OPTIONS
+
+    async def get_session():
+        return pool.get("https://satellite.example.com", options)
+
+    first_loop = asyncio.new_event_loop()
+    second_loop = asyncio.new_event_loop()
+    first = first_loop.run_until_complete(get_session())
+    second = second_loop.run_until_complete(get_session())
+    assert first is not second
+    first_loop.run_until_complete(first.close())
+    second_loop.run_until_complete(pool.close())
+    first_loop.close()
+    second_loop.close()
+
+
+@pytest.fixture
+def ca_file(tmp_path):
+    system_ca_file = ssl.get_default_verify_paths().cafile
+    if not system_ca_file or not os.path.exists(system_ca_file):
+        pytest.skip("No system CA bundle to load")
+    path = tmp_path / "ca.pem"
+    shutil.copy(system_ca_file, path)
+    yield str(path)
+
+
+def test_ssl_contexts_are_cached_per_ca_file(ca_file):
+    config = dict(PLUGIN_CONFIG, url="https://satellite.example.com", ca_file=ca_file)
+    first = SatelliteAPI.from_plugin_config(config).context
+    assert SatelliteAPI.from_plugin_config(config).context is first
+    assert (
+        SatelliteAPI.from_plugin_config(dict(config, validate_cert="0")).context
+        is not first
+    )
+
+    stat = os.stat(ca_file)
+    os.utime(ca_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert SatelliteAPI.from_plugin_config(config).context is not first
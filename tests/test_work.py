@@ -1,13 +1,15 @@
+import asyncio
 import json
 import logging
+import threading
 import os
 import pytest
 import queue
 
 from receptor_satellite import worker
+from receptor_satellite.admission import admission
 from receptor_satellite.satellite_api import HEALTH_OK, HEALTH_CHECK_OK
 
-
 logger = logging.getLogger(__name__)
 
 
@@ -36,3 +38,45 @@ def test_health_check_task():
     logger.info(result)
     assert result["result"] == HEALTH_CHECK_OK
     assert result["code"] == HEALTH_OK
+
+
+def test_run_uses_persistent_event_loop():
+    async def current_loop():
+        return asyncio.get_event_loop(), threading.current_thread()
+
+    first_loop, first_thread = worker.run(current_loop())
+    second_loop, second_thread = worker.run(current_loop())
+    assert first_loop is second_loop
+    assert first_thread is second_thread
+    assert first_thread is not threading.current_thread()
+
+
+def test_admission_limits_are_changed_in_the_event_loop():
+    async def hold_slot():
+        admission.configure(max_runs=1)
+        await admission.acquire(1)
+
+    async def queued():
+        # asyncio.sleep is stubbed out by other test modules
+        loop = asyncio.get_event_loop()
+        while not admission.waiting:
+            future = loop.create_future()
+            loop.call_later(0.01, future.set_result, None)
+            await future
+
+    async def reset():
+        waiting.cancel()
+        admission.release(admission.hosts, runs=admission.runs)
+        admission.configure()
+
+    worker.run(hold_slot())
+    loop = worker.event_loop.start()
+    waiting = asyncio.run_coroutine_threadsafe(admission.acquire(1), loop)
+    try:
+        worker.run(asyncio.wait_for(queued(), 1))
+        # Lift the limit from this thread, the waiting run has to be woken
+        # up before any timer of the loop could do it by chance
+        worker.configure_admission({})
+        waiting.result(timeout=0.2)
+    finally:
+        worker.run(reset())